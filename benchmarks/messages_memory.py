@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of memory used by incoming messages, which are
+waiting in workers' queues: messages with __slots__ against
+the same messages with __dict__.
+
+Run it from project directory:
+PYTHONPATH=. python benchmarks/messages_memory.py
+"""
+
+import tracemalloc
+
+from leonard.adapter import IncomingMessage
+from leonard.utils import clean_message, normalize_message
+
+MESSAGES_COUNTS = [1000, 10000, 50000]
+TEXT = 'Hey, Leonard, what is the weather for tomorrow in London?'
+
+
+class DictIncomingMessage:
+    """
+    Incoming message with the same attributes in __dict__
+    and eagerly normalizated text, as it was before __slots__
+    """
+    def __init__(self, adapter_id, text='', attachments=None, location=None,
+                 variables=None):
+        self.text = text
+        self.attachments = attachments or []
+        self.location = location
+        self.variables = variables
+        self.locale = None
+        self.uncleaned_text = self.text
+        self.text = clean_message(self.text)
+        self.normalizated_text = normalize_message(self.text)
+        self.adapter_id = adapter_id
+        self.sender = None
+        self.ross_params = None
+
+
+def measure(message_class, messages_count):
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    messages = [message_class('console{}'.format(i), text=TEXT,
+                              variables={'console_id': i})
+                for i in range(messages_count)]
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in end.compare_to(start, 'filename'))
+    return used / len(messages)
+
+
+def main():
+    for messages_count in MESSAGES_COUNTS:
+        print('{} messages: __slots__ {:.0f} bytes, __dict__ {:.0f} bytes '
+              'per message'.format(
+                  messages_count,
+                  measure(IncomingMessage, messages_count),
+                  measure(DictIncomingMessage, messages_count)))
+
+
+if __name__ == '__main__':
+    main()
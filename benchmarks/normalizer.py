@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of message normalizing: replacing every symbol
+and word one by one against compiled clean_message
+and normalize_message.
+
+Run it from project directory:
+PYTHONPATH=. python benchmarks/normalizer.py
+"""
+
+import random
+import timeit
+
+from leonard.utils import (REPLACE_SYMBOLS, REPLACE_WORDS,
+                           clean_message, normalize_message)
+
+WORDS_COUNTS = [5, 20, 100, 1000]
+MESSAGES_COUNT = 200
+# Most words of messages are meaningful, some are deleted by normalizing
+WORDS = ['weather', 'tomorrow', 'taylor', 'swift', 'note', 'buy', 'milk',
+         'london', 'news', 'prime', 'number', 'remind', 'call', 'mom',
+         'погода', 'завтра', 'купить', 'молоко', 'новости', 'напомни',
+         'Hey,', 'Leonard!', 'who', 'is', 'what?', 'please', 'i', 'need']
+
+
+def clean_message_one_by_one(message_text):
+    message_text = message_text.lower()
+    for symbol in REPLACE_SYMBOLS:
+        message_text = message_text.replace(symbol, ' ')
+    return ' '.join(message_text.split())
+
+
+def normalize_message_one_by_one(message_text):
+    message_text = " " + message_text + " "
+    for word in REPLACE_WORDS:
+        message_text = message_text.replace(" " + word + " ", '')
+    return ' '.join(message_text.split())
+
+
+def run(clean, normalize, messages):
+    for message in messages:
+        normalize(clean(message))
+
+
+def main():
+    for words_count in WORDS_COUNTS:
+        messages = [' '.join(random.choice(WORDS) for i in range(words_count))
+                    for j in range(MESSAGES_COUNT)]
+        for message in messages:
+            cleaned = clean_message_one_by_one(message)
+            assert clean_message(message) == cleaned
+            assert (normalize_message(cleaned) ==
+                    normalize_message_one_by_one(cleaned))
+        one_by_one = min(timeit.repeat(
+            lambda: run(clean_message_one_by_one,
+                        normalize_message_one_by_one, messages),
+            number=5, repeat=3
+        ))
+        compiled = min(timeit.repeat(
+            lambda: run(clean_message, normalize_message, messages),
+            number=5, repeat=3
+        ))
+        print('{} words: one by one {:.1f} us, compiled {:.1f} us '
+              'per message ({:.1f}x)'.format(
+                  words_count,
+                  one_by_one / (5 * MESSAGES_COUNT) * 10 ** 6,
+                  compiled / (5 * MESSAGES_COUNT) * 10 ** 6,
+                  one_by_one / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of message hooks checking: hooks one by one
+against RegexMatcher with one combined pattern.
+
+Run it from project directory:
+PYTHONPATH=. python benchmarks/regex_matcher.py
+"""
+
+import random
+import string
+import timeit
+
+from leonard import hooks, matchers
+from leonard.adapter import IncomingMessage
+
+PATTERNS_COUNTS = [10, 50, 100, 500, 1000]
+MESSAGES_COUNT = 200
+
+
+def random_word(length=6):
+    return ''.join(random.choice(string.ascii_lowercase)
+                   for i in range(length))
+
+
+def create_hooks(patterns_count):
+    message_hooks = []
+    for i in range(patterns_count):
+        message_hooks.append(hooks.MessageHook(
+            None, [random_word() + r' (\d+)', r'(\d+) ' + random_word()]
+        ))
+    return message_hooks
+
+
+def check_one_by_one(message_hooks, message):
+    for hook in message_hooks:
+        if hook.check(message, None):
+            return hook
+
+
+def check_by_matcher(matcher, message):
+    for (hook, variables) in matcher.find(message, None):
+        return hook
+
+
+def main():
+    random.seed(0)
+    print('{:>9} {:>14} {:>14} {:>8}'.format('patterns', 'one by one, us',
+                                             'matcher, us', 'speedup'))
+    for patterns_count in PATTERNS_COUNTS:
+        message_hooks = create_hooks(patterns_count)
+        matcher = matchers.RegexMatcher(message_hooks)
+        # Half of messages don't match any hook, so all hooks are checked
+        messages = []
+        for i in range(MESSAGES_COUNT):
+            if i % 2:
+                text = random.choice(message_hooks).regexes[0].replace(
+                    r'(\d+)', str(i))
+            else:
+                text = random_word() + ' ' + random_word()
+            messages.append(IncomingMessage('benchmark', text=text,
+                                            variables={}))
+
+        for message in messages:
+            assert (check_one_by_one(message_hooks, message) ==
+                    check_by_matcher(matcher, message))
+
+        one_by_one_time = min(timeit.repeat(
+            lambda: [check_one_by_one(message_hooks, message)
+                     for message in messages], number=1, repeat=5
+        )) / MESSAGES_COUNT * 10 ** 6
+        matcher_time = min(timeit.repeat(
+            lambda: [check_by_matcher(matcher, message)
+                     for message in messages], number=1, repeat=5
+        )) / MESSAGES_COUNT * 10 ** 6
+        print('{:>9} {:>14.1f} {:>14.1f} {:>7.1f}x'.format(
+            patterns_count * 2, one_by_one_time, matcher_time,
+            one_by_one_time / matcher_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of bytes sent to MongoDB by User.update for usual
+messages of user with many notes: replacing of whole document
+against $set/$unset of changed fields.
+
+Run it from project directory:
+PYTHONPATH=. python benchmarks/user_updates.py
+"""
+
+import time
+
+import bson
+
+from leonard.db import Database, User
+from leonard.utils.cache import LRUCache
+
+NOTES_COUNTS = [0, 10, 100, 1000]
+
+
+class RecordingCollection:
+    """
+    Collection that counts BSON bytes of updates instead of sending them
+    """
+    def __init__(self):
+        self.sent_bytes = 0
+        self.writes = 0
+
+    def update_one(self, spec, changes):
+        self.writes += 1
+        self.sent_bytes += len(bson.BSON.encode(spec))
+        self.sent_bytes += len(bson.BSON.encode(changes))
+        # Document is never changed by another process
+        return UpdateResult(matched_count=1)
+
+
+class UpdateResult:
+    def __init__(self, matched_count):
+        self.matched_count = matched_count
+
+
+class RecordingDatabase:
+    """
+    Database without MongoDB connection, users are cached
+    like in Database after saving
+    """
+    save_to_cache = Database.save_to_cache
+    invalidate_user = Database.invalidate_user
+
+    def __init__(self):
+        self.collection = RecordingCollection()
+        self.users_cache = LRUCache()
+
+
+def create_user_data(notes_count):
+    return {
+        'adapter_id': 'tg12345',
+        'language': 'en',
+        'location': [55.75, 37.61],
+        'utc_offset': 3,
+        'question': '',
+        'notes': [{'id': i, 'text': 'Buy milk and bread #{}'.format(i),
+                   'datetime': time.time()} for i in range(notes_count)]
+    }
+
+
+def handle_messages(user):
+    """
+    Changes of user data like in parse_message and plugins
+    """
+    # Adapter variables and question state
+    user.data['last_message'] = {'message_id': 1, 'text': 'last note'}
+    user.update()
+    user.data['question'] = ''
+    user.update()
+    # Notes plugin reads notes, but doesn't change them
+    sorted(user.data['notes'], key=lambda note: note['datetime'])
+    user.update()
+    # Notes plugin adds note
+    user.data['notes'].append({'id': -1, 'text': 'New note',
+                               'datetime': time.time()})
+    user.update()
+
+
+def main():
+    for notes_count in NOTES_COUNTS:
+        data = create_user_data(notes_count)
+        database = RecordingDatabase()
+        handle_messages(User('tg12345', dict(data), database))
+        # Before dirty tracking whole document was sent on every update
+        replaced_bytes = 4 * len(bson.BSON.encode(data))
+        print('{} notes: whole document {} bytes, changed fields {} bytes '
+              'in {} writes'.format(notes_count, replaced_bytes,
+                                    database.collection.sent_bytes,
+                                    database.collection.writes))
+
+
+if __name__ == '__main__':
+    main()
@@ -40,8 +40,13 @@ class Adapter:
 class Message:
     """
     Class for every message: incoming and outgoing.
+    Bot holds many messages in workers' queues, so messages
+    have __slots__ instead of __dict__ for every object.
     """
-    def __init__(self, text='', attachments=[], location=None, variables={}):
+    __slots__ = ('text', 'attachments', 'location', 'variables', 'locale')
+
+    def __init__(self, text='', attachments=None, location=None,
+                 variables=None):
         """
         Create new message.
 
@@ -54,13 +59,20 @@ class Message:
                           Parameters should start from adapter name.
         """
         self.text = text
+        # Every message has its own list and dict, because hooks
+        # change variables of message (regex_match, query)
+        if attachments is None:
+            self.attachments = []
         # If attachment only one, convert it to list
-        if type(attachments) == Attachment:
+        elif type(attachments) == Attachment:
             self.attachments = [attachments]
         else:
             self.attachments = attachments
         self.location = location
-        self.variables = variables
+        if variables is None:
+            self.variables = {}
+        else:
+            self.variables = variables
         # Correct locale for hooked plugin.
         # For example, object of EnglishLocale of hello plugin
         self.locale = None
@@ -85,6 +97,8 @@ class IncomingMessage(Message):
     """
     Class for messages from user.
     """
+    __slots__ = ('uncleaned_text', 'adapter_id', 'sender', 'language',
+                 'ross_params', '_views')
 
     def __init__(self, adapter_id, *args, **kwargs):
         """
@@ -96,18 +110,107 @@ class IncomingMessage(Message):
         super().__init__(*args, **kwargs)
         self.uncleaned_text = self.text
         self.text = clean_message(self.text)
-        self.normalizated_text = normalize_message(self.text)
         self.adapter_id = adapter_id
         # Sender will be set by users middleware
         self.sender = None
+        # Language of sender, if bot knows it
+        self.language = None
+        # Params of message from Ross, parsed by first Ross hook
+        self.ross_params = None
+        # Views of message text (normalizated text, words, numbers),
+        # they are computed on first use and shared by all hooks.
+        # (name of view, normalize) => value
+        self._views = {}
+
+    @property
+    def normalizated_text(self):
+        """
+        Message text without words, that not effecting on user's message.
+        It isn't computed for answers to questions, which don't need hooks.
+
+        :return: str
+        """
+        key = ('text', True)
+        if key not in self._views:
+            self._views[key] = normalize_message(self.text)
+        return self._views[key]
+
+    @normalizated_text.setter
+    def normalizated_text(self, value):
+        # Views of old normalizated text are not actual
+        self._views = {key: view for (key, view) in self._views.items()
+                       if not key[1]}
+        self._views[('text', True)] = value
+
+    def get_words(self, normalize=False):
+        """
+        Get words of cleaned or normalizated message text.
+        List is shared by all hooks, so it shouldn't be changed.
+
+        :param normalize: bool, use normalizated text or not
+        :return: list of str
+        """
+        key = ('words', normalize)
+        if key not in self._views:
+            if normalize:
+                self._views[key] = self.normalizated_text.split()
+            else:
+                self._views[key] = self.text.split()
+        return self._views[key]
+
+    def get_word_set(self, normalize=False):
+        """
+        Get set of words of cleaned or normalizated message text
+
+        :param normalize: bool, use normalizated text or not
+        :return: set of str
+        """
+        key = ('word_set', normalize)
+        if key not in self._views:
+            self._views[key] = set(self.get_words(normalize))
+        return self._views[key]
+
+    def get_ngrams(self, n, normalize=False):
+        """
+        Get all phrases of n words from message
+
+        'buy some milk'; 2 => {'buy some', 'some milk'}
+
+        :param n: int, number of words in phrase
+        :param normalize: bool, use normalizated text or not
+        :return: set of str
+        """
+        key = ('ngrams', normalize, n)
+        if key not in self._views:
+            words = self.get_words(normalize)
+            self._views[key] = set(
+                ' '.join(words[i:i + n]) for i in range(len(words) - n + 1)
+            )
+        return self._views[key]
+
+    def get_numbers(self, normalize=False):
+        """
+        Get all numbers in words of cleaned or normalizated message text
+
+        'numbers between 5 and 20' => [5, 20]
+
+        :param normalize: bool, use normalizated text or not
+        :return: list of int
+        """
+        key = ('numbers', normalize)
+        if key not in self._views:
+            self._views[key] = [int(word) for word in self.get_words(normalize)
+                                if word.isdigit()]
+        return self._views[key]
 
 
 class OutgoingMessage(Message):
     """
     Class for messages from bot.
     """
+    __slots__ = ('recipient', 'buttons', 'is_question')
 
-    def __init__(self, recipient, buttons=[], *args, **kwargs):
+    def __init__(self, recipient, buttons=None, *args, **kwargs):
         """
         Create new message from bot
 
@@ -117,7 +220,10 @@ class OutgoingMessage(Message):
         """
         super().__init__(*args, **kwargs)
         self.recipient = recipient
-        self.buttons = buttons
+        if buttons is None:
+            self.buttons = []
+        else:
+            self.buttons = buttons
         self.is_question = False
 
 
@@ -125,6 +231,7 @@ class Attachment:
     """
     Class for every attachment: incoming and outgoing
     """
+    __slots__ = ('type', 'path', 'text', 'id', 'lat', 'lng')
 
     def __init__(self, attachment_type, attachment_path=None,
                  attachment_text='', attachment_id=None,
@@ -8,22 +8,25 @@
 Copyright (C) 2015
 """
 
-import time
 import pickle
 import threading
 
-import schedule
-
 from leonard import adapter
 from leonard import config
 from leonard import db
 from leonard import exceptions
+from leonard import leader
 from leonard import manager
+from leonard import scheduler
 from leonard import storage
-from leonard.utils import CANCEL_WORDS, logger, analytics, NextHook
+from leonard import workers
+from leonard.utils import CANCEL_WORDS, logger, analytics, NextHook, utc
 
 from plugins import utils as utils_plugin
 
+# Pickled data starts with PROTO opcode
+PICKLE_PREFIX = b'\x80'
+
 
 class Leonard:
     """
@@ -49,6 +52,8 @@ class Leonard:
 
         self._load_plugins()
 
+        self._load_workers(command_line_arguments)
+
     def _load_config(self, command_line_arguments):
         """
         Create and load bot config.
@@ -148,6 +153,50 @@ class Leonard:
                 if variable not in self.config.variables:
                     self.config.variables[variable] = plugin.config.variables[variable]
 
+    def _load_workers(self, command_line_arguments):
+        """
+        Create pool of threads for processing incoming messages
+
+        :param command_line_arguments: dict, arguments for creating config:
+                                       config-prefix - prefix of environment
+                                                       variables.
+                                                       Default - 'LEONARD_'
+        :return:
+        """
+        config_prefix = command_line_arguments['config-prefix']
+        self.workers = workers.WorkerPool(
+            workers=int(self.config.get(
+                '{}WORKERS'.format(config_prefix), '8'
+            )),
+            queue_size=int(self.config.get(
+                '{}QUEUE_SIZE'.format(config_prefix), '100'
+            )),
+            name='message'
+        )
+        # Interval hooks run in their own small pool,
+        # so they don't wait for messages
+        self.interval_workers = workers.WorkerPool(
+            workers=int(self.config.get(
+                '{}INTERVAL_WORKERS'.format(config_prefix), '2'
+            )),
+            queue_size=int(self.config.get(
+                '{}INTERVAL_QUEUE_SIZE'.format(config_prefix), '10'
+            )),
+            name='interval'
+        )
+        # Interval hooks run only in one of bot processes
+        self.leader = leader.LeaderElection(
+            self.storage,
+            lease_time=float(self.config.get(
+                '{}LEADER_LEASE_TIME'.format(config_prefix), '15'
+            ))
+        )
+        self.scheduler = scheduler.IntervalScheduler(self,
+                                                     self.interval_workers,
+                                                     self.leader)
+        # Thread of leader election, it's started by start()
+        self.leader_thread = None
+
     def start(self):
         """
         Start getting, parsing and answering messages
@@ -156,19 +205,44 @@ class Leonard:
         """
         logger.info_message('Starting bot')
 
+        self.leader_thread = threading.Thread(target=self.leader.run,
+                                              name='leader')
+        self.leader_thread.daemon = True
+        self.leader_thread.start()
+
         interval_thread = threading.Thread(
             target=self.start_interval_hooks,
             args=()
         )
         interval_thread.start()
 
-        for message in self.adapter.module.get_messages(self):
-            # Parse message in new thread
-            message_thread = threading.Thread(
-                target=self.parse_message,
-                args=(message, )
-            )
-            message_thread.start()
+        self.workers.start()
+
+        try:
+            for message in self.adapter.module.get_messages(self):
+                # Parse message in workers pool. Messages from one user
+                # are parsed one by one in order of receiving, messages
+                # from different users are parsed in parallel.
+                # If queue of messages is full, it blocks getting new
+                # messages from adapter.
+                self.workers.submit(self.parse_message, message,
+                                    key=message.adapter_id)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop interval hooks and release leadership, so other bot
+        process runs interval hooks without waiting for lease expiration
+
+        :return:
+        """
+        logger.info_message('Stopping bot')
+        self.scheduler.stop()
+        self.leader.stop()
+        if self.leader_thread is not None:
+            # Leader thread releases lease after stopping
+            self.leader_thread.join(self.leader.lease_time)
 
     def parse_message(self, message):
         """
@@ -181,65 +255,76 @@ class Leonard:
 
         # Connect users middleware
         message.sender = self.database.find_by_adapter_id(message.adapter_id)
+        # All changes of sender are saved in MongoDB
+        # by one request after processing of message
+        unit_of_work = db.UnitOfWork(self.database)
+        unit_of_work.add(message.sender)
+        try:
+            self._process_message(message)
+        finally:
+            unit_of_work.close()
+
+    def _process_message(self, message):
+        """
+        Answer question or find matched hook for message with sender
+
+        :param message: IncomingMessage object
+        :return:
+        """
         # If we know message.sender language, add it to message.language
         if 'language' in message.sender.data:
             message.language = message.sender.data['language']
         else:
             logger.warning_message('Language not set for ', message)
 
+        # Raw message from adapter is different in every message,
+        # so it's saved in Redis and user isn't rewritten because of it
+        if 'last_message' in message.variables:
+            self.storage.save_last_message(message.adapter_id,
+                                           message.variables['last_message'])
+
         # If some adapter's variables not saved in DB or changed,
         # update it
         for variable in message.variables:
+            if variable == 'last_message':
+                continue
             if (variable not in message.sender.data or
                     message.variables[variable] != message.sender.data[variable]):
                 message.sender.data[variable] = message.variables[variable]
         message.sender.update()
 
-        # TODO: Move to different function
-        if ('question' in message.sender.data and
-                message.sender.data['question'] != ''):
+        question = self.get_question(message.sender)
+        if question is not None:
             logger.info_message('Detected question answer for', message)
             # Check, may be user sent message for quit from question
             if message.text in CANCEL_WORDS:
                 utils_plugin.cancel_from_question(message, self)
-                message.sender.data['question'] = ''
-                message.sender.update()
                 return
-            # Parse question callback
-            callback = pickle.loads(message.sender.data['question'])
-            # Delete question, but save plugin name
-            plugin_name = message.sender.data['question_plugin']
-            message.sender.data['question'] = ''
-            message.sender.update()
+            callback = self.get_question_callback(question)
+            if callback is None:
+                logger.error_message('Question callback not found for',
+                                     message)
+                return
+            if question.get('payload') is not None:
+                message.variables['question_payload'] = question['payload']
             # Add correct locale for message
             user_locale = message.sender.data.get('language', None)
             if user_locale:
-                plugin = self.plugins_manager.get_plugin_by_name(plugin_name)
+                plugin = self.plugins_manager.get_plugin_by_name(
+                    question['plugin']
+                )
                 message.locale = plugin.localization.get(user_locale)
             # Run callback
             callback(message, self)
             return
 
-        found_hooks = []
-        for plugin in self.plugins_manager.plugins:
-            hooks = plugin.check_hooks(message)
-            found_hooks.extend(hooks)
-
-        if not found_hooks:
-            logger.warning_message('Hooks not found for', message)
-            return
-        logger.info_message('Found', len(found_hooks), 'hooks')
-        # Sort found hooks by priority of plugin and priority of hook,
-        # than call the most appropriate
-        found_hooks.sort(
-            key=lambda h: (
-                h.plugin.config.priority,
-                h.priority
-            ),
-            reverse=True
-        )
-
-        for hook in found_hooks:
+        # Router checks hooks in order of priority and stops on
+        # the first matched one. If plugin rejected message,
+        # router continues checking from the next hook.
+        router = self.plugins_manager.router
+        for hook in router.route(message, self):
+            logger.info_message('Found hook', hook.func.__name__, 'in',
+                                hook.plugin)
             # Add correct locale for message
             user_locale = message.sender.data.get('language', None)
             if user_locale:
@@ -247,7 +332,8 @@ class Leonard:
 
             try:
                 hook.call(message, self)
-            except Exception:
+            except NextHook:
+                # Plugin rejected message, so check the next hook
                 continue
 
             # Track message using Botan.io analytics in new thread
@@ -263,21 +349,22 @@ class Leonard:
             analytics_thread.start()
             return
 
+        logger.warning_message('Hooks not found for', message)
+
     def start_interval_hooks(self):
         """
-        Start all interval hooks in plugins using schedule module
+        Start all interval hooks in plugins using scheduler.
+        Blocks current thread.
 
         :return:
         """
+        self.interval_workers.start()
         for plugin in self.plugins_manager.plugins:
             for hook in plugin.interval_hooks:
-                # Call hook with bot argument
-                hook.interval.do(lambda: hook.call(self))
-                logger.info_message('Added interval hook', hook)
+                self.scheduler.add(hook)
+                logger.info_message('Added interval hook', hook.func.__name__)
 
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        self.scheduler.run()
 
     def send_message(self, message):
         """
@@ -289,23 +376,88 @@ class Leonard:
         logger.info_message('Sending message', message)
         self.adapter.module.send_message(message, self)
 
-    def ask_question(self, message, callback, plugin_name):
+    def ask_question(self, message, callback, plugin_name, payload=None):
         """
         Ask about something the user from plugin.
 
         :param message: OutgoingMessage object
         :param callback: function that called with (message, bot)
-                         after users next message
+                         after users next message. It should be registered
+                         by leonard.hooks.question_callback.
         :param plugin_name: str, name of plugin that asks question
+        :param payload: list/dict, small data for callback, it's available
+                        in message.variables['question_payload']
         :return:
         """
         logger.info_message('Asking question', message)
         message.is_question = True
         self.send_message(message)
-        message.recipient.data['question'] = pickle.dumps(callback)
-        message.recipient.data['question_plugin'] = plugin_name
+        callback_id = getattr(callback, '_leonard_question_callback', None)
+        if callback_id is None:
+            # Not registered callbacks still work, but they are pickled
+            logger.warning_message('Question callback {} is not '
+                                   'registered'.format(callback.__name__))
+            callback_id = pickle.dumps(callback)
+        if self.storage.redis:
+            self.storage.save_question(message.recipient.adapter_id,
+                                       callback_id, plugin_name, payload)
+            return
+        # Questions are needed by plugins, which work without Redis,
+        # so without Redis question is saved in user's document
+        message.recipient.data['question'] = {
+            'callback': callback_id,
+            'plugin': plugin_name,
+            'payload': payload,
+            'expires': utc() + self.storage.question_ttl
+        }
         message.recipient.update()
 
+    def get_question(self, user):
+        """
+        Get question that waits for user's answer and delete it.
+        Questions are saved in Redis. Questions asked without Redis
+        and questions asked before Redis storage are saved
+        in user's document, so they are deleted from it.
+
+        :param user: User object
+        :return: dict with callback, plugin and payload or None
+        """
+        question = self.storage.pop_question(user.adapter_id)
+        if 'question' in user.data:
+            saved_question = user.data.pop('question')
+            plugin_name = user.data.pop('question_plugin', None)
+            user.update()
+            if question is not None or not saved_question:
+                return question
+            if isinstance(saved_question, dict):
+                # Question asked without Redis, it expires like in Redis
+                if saved_question['expires'] > utc():
+                    question = saved_question
+            else:
+                # Pickled callback of question asked before Redis storage
+                question = {'callback': saved_question,
+                            'plugin': plugin_name, 'payload': None}
+        return question
+
+    def get_question_callback(self, question):
+        """
+        Find function for answer to question
+
+        :param question: dict from get_question
+        :return: function or None
+        """
+        callback = question['callback']
+        # Redis returns bytes, but user's document keeps id as str
+        if isinstance(callback, bytes):
+            # Questions asked before callbacks registration
+            # have pickled callbacks
+            if callback.startswith(PICKLE_PREFIX):
+                return pickle.loads(callback)
+            callback = callback.decode('utf-8')
+        return self.plugins_manager.get_question_callback(
+            question['plugin'], callback
+        )
+
     def get_locale(self, plugin_name, language_code):
         """
         Get plugin locale from bot object. It's needed in interval hooks.
@@ -9,12 +9,33 @@ Interface to MongoDB storage.
 
 Copyright (C) 2015
 """
+import copy
 import time
 
-from pymongo import MongoClient
-from bson import ObjectId
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
 
 from leonard.utils import logger, location
+from leonard.utils.cache import LRUCache
+
+# Fields of user's document that can be big and are needed
+# only for some plugins. They aren't read with user's document,
+# but are loaded on first access.
+HEAVY_FIELDS = ('notes', 'recommended_places', 'all_notes_buffer',
+                'last_message')
+# Projection of user's document without heavy fields
+CORE_PROJECTION = {field: False for field in HEAVY_FIELDS}
+# Number of saving attempts, if user's document was changed
+# by another worker or bot process at the same time
+MAX_UPDATE_ATTEMPTS = 3
+
+
+class ConflictError(Exception):
+    """
+    Exception that raises if changes of user can't be saved,
+    because his document is changed by another process again and again.
+    """
+    pass
 
 
 class Database:
@@ -36,6 +57,24 @@ class Database:
         self.db = self.client.leonard
         self.collection = self.db.users
         self.bot = bot
+        # Documents of active users, so messages of chatting user
+        # don't need MongoDB reading. adapter_id => dict
+        self.users_cache = LRUCache(
+            max_size=int(bot.config.get(
+                '{}USERS_CACHE_SIZE'.format(config_prefix), '1000'
+            )),
+            ttl=int(bot.config.get(
+                '{}USERS_CACHE_TTL'.format(config_prefix), '300'
+            ))
+        )
+        # Every user is found by adapter_id on every message, and
+        # unique index doesn't allow duplicates of user, if his
+        # first messages are processed at the same time
+        try:
+            self.collection.create_index('adapter_id', unique=True)
+        except PyMongoError as error:
+            logger.error_message('Error while creating index of users:')
+            logger.error_message(str(error))
 
     def find_by_adapter_id(self, adapter_id):
         """
@@ -44,31 +83,68 @@ class Database:
         :param adapter_id: str, user id from adapter
         :return: User object
         """
-        cursor = self.collection.find({
+        user = self.users_cache.get(adapter_id)
+        if user is not None:
+            # Every User object has its own copy of document
+            return User(adapter_id, copy.deepcopy(user), self,
+                        lazy_fields=HEAVY_FIELDS)
+
+        user = self.collection.find_one({
             'adapter_id': adapter_id
-        })
-        if cursor.count() == 0:
+        }, CORE_PROJECTION)
+        if user is None:
             return self.create_new_user(adapter_id)
 
-        user = list(cursor)[0]
-        return User(user['adapter_id'], user, self)
+        self.users_cache.set(adapter_id, copy.deepcopy(user))
+        return User(user['adapter_id'], user, self, lazy_fields=HEAVY_FIELDS)
 
     def create_new_user(self, adapter_id):
         """
-        Create new user in MongoDB
+        Create new user in MongoDB. If user was already created
+        (for example, by another worker), return existing user.
 
         :param adapter_id: str, user id from adapter
         :return: User object
         """
-        result = self.collection.insert_one({
-            'adapter_id': adapter_id
-        })
-        user = list(
-            self.collection.find({
-                '_id': ObjectId(result.inserted_id)
+        try:
+            user = self.collection.find_one_and_update(
+                {'adapter_id': adapter_id},
+                {'$setOnInsert': {'adapter_id': adapter_id, 'version': 0}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another upsert inserted the same user at the same time
+            user = self.collection.find_one({
+                'adapter_id': adapter_id
             })
-        )[0]
-        return User(user['adapter_id'], user, self)
+        user = User(user['adapter_id'], user, self)
+        self.save_to_cache(user)
+        return user
+
+    def save_to_cache(self, user):
+        """
+        Save actual data of user without heavy fields
+        to cache after saving it in MongoDB
+
+        :param user: User object
+        :return:
+        """
+        document = user.data.get_loaded()
+        # Heavy fields are loaded only when they are needed
+        for field in HEAVY_FIELDS:
+            document.pop(field, None)
+        self.users_cache.set(user.adapter_id, copy.deepcopy(document))
+
+    def invalidate_user(self, adapter_id):
+        """
+        Delete user from cache, so next finding reads him from MongoDB.
+        Call it after changing user's document not by User.update.
+
+        :param adapter_id: str, user id from adapter
+        :return:
+        """
+        self.users_cache.delete(adapter_id)
 
     def find(self, params):
         """
@@ -84,29 +160,149 @@ class User:
     """
     Class for each user to store his data
     """
-    def __init__(self, adapter_id, data, database):
+    def __init__(self, adapter_id, data, database, lazy_fields=()):
         """
         Create new user object from user in MongoDB
 
         :param adapter_id: str, user id from adapter
         :param data: dict with user data from database
         :param database: Database object
+        :param lazy_fields: list of str, fields that weren't read from
+                            MongoDB and will be loaded on first access
         :return:
         """
         self.adapter_id = adapter_id
-        self.data = data
+        self.data = UserData(
+            data,
+            lazy_fields=[field for field in lazy_fields if field not in data],
+            load_fields=self.load_fields
+        )
         self.database = database
+        # UnitOfWork object, if changes of user are saved
+        # after processing of message
+        self.unit_of_work = None
 
     def update(self):
         """
-        Edit user object in MongoDB from data param
-        of User object
+        Save changed fields of data param of User object
+        in MongoDB. If user is in unit of work, changes are
+        saved when message processing is finished.
 
         :return:
         """
-        self.database.collection.update({
+        if self.unit_of_work is not None:
+            self.unit_of_work.add(self)
+            return
+        changes = self.get_changes()
+        if changes is None:
+            return
+        result = self.database.collection.update_one(self.get_filter(),
+                                                     changes)
+        if result.matched_count:
+            self.mark_saved()
+        else:
+            self.resolve_conflict()
+
+    def flush(self):
+        """
+        Save all changes of user in MongoDB right now.
+        Useful for plugins, that need saved data before
+        message processing is finished.
+
+        :return:
+        """
+        if self.unit_of_work is not None:
+            self.unit_of_work.flush()
+        else:
+            self.update()
+
+    def load_fields(self, fields):
+        """
+        Read fields of user's document from MongoDB
+
+        :param fields: list of str
+        :return: dict with found fields
+        """
+        document = self.database.collection.find_one({
             'adapter_id': self.adapter_id
-        }, self.data)
+        }, {field: True for field in fields})
+        return document or {}
+
+    def get_changes(self):
+        """
+        Get MongoDB update of changed fields of user.
+        If nothing was changed, returns None.
+
+        :return: dict with $set, $unset and $inc of version or None
+        """
+        set_fields, unset_fields = self.data.get_changes()
+        if not set_fields and not unset_fields:
+            return None
+        # Every saving increases version of document
+        changes = {'$inc': {'version': 1}}
+        if set_fields:
+            changes['$set'] = set_fields
+        if unset_fields:
+            changes['$unset'] = unset_fields
+        return changes
+
+    def get_filter(self):
+        """
+        Get MongoDB filter of user's document with version,
+        that was read. If document was changed by another process,
+        filter doesn't match it.
+
+        :return: dict
+        """
+        version = self.data.get('version', 0)
+        if not version:
+            # Documents created before versions don't have version
+            version = {'$in': [0, None]}
+        return {'adapter_id': self.adapter_id, 'version': version}
+
+    def mark_saved(self):
+        """
+        Mark changes of user as saved in MongoDB after
+        successful saving and update cache
+
+        :return:
+        """
+        version = self.data.get('version', 0)
+        self.data.save_changes()
+        self.data.set_saved('version', version + 1)
+        self.database.save_to_cache(self)
+
+    def resolve_conflict(self):
+        """
+        Save changes of user, whose document was changed
+        by another process after reading. Document is read again,
+        fields changed by this User object replace fields in it
+        and saving is tried again with new version.
+
+        :return:
+        """
+        self.database.invalidate_user(self.adapter_id)
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            document = self.database.collection.find_one(
+                {'adapter_id': self.adapter_id},
+                self.data.get_projection()
+            )
+            if document is None:
+                break
+            self.data.merge(document)
+            changes = self.get_changes()
+            if changes is None:
+                return
+            result = self.database.collection.update_one(self.get_filter(),
+                                                         changes)
+            if result.matched_count:
+                self.mark_saved()
+                return
+            logger.warning_message('Conflict while saving', self,
+                                   'attempt', attempt + 1)
+        raise ConflictError(
+            "Can't save changes of user {}".format(self.adapter_id)
+        )
 
     def update_location_data(self, coordinates):
         """
@@ -122,3 +318,316 @@ class User:
 
     def __str__(self):
         return 'User #{}: {}'.format(self.adapter_id, self.data)
+
+
+class UserData(dict):
+    """
+    Dict with user data, which remembers changed keys, so
+    only they are sent to MongoDB. Plugins change lists and
+    dicts in user data (user.data['notes'].append(note)), so
+    copy of every list or dict is saved on first reading
+    and compared with value before saving.
+    Lazy fields aren't read with document, they are loaded
+    on first access to them.
+    """
+    def __init__(self, data=None, lazy_fields=(), load_fields=None):
+        """
+        Create user data from MongoDB document
+
+        :param data: dict, document of user
+        :param lazy_fields: list of str, fields that aren't loaded yet
+        :param load_fields: function, gets list of fields
+                            and returns dict with loaded fields
+        """
+        super().__init__(data or {})
+        # Keys that were set or deleted
+        self._changed = set()
+        # Key => copy of list or dict value, that was read
+        self._copies = {}
+        self._lazy_fields = set(lazy_fields)
+        self._load_fields = load_fields
+
+    def __getitem__(self, key):
+        self._load(key)
+        value = super().__getitem__(key)
+        self._copy_value(key, value)
+        return value
+
+    def __contains__(self, key):
+        self._load(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        # New value doesn't need loading of old one
+        self._lazy_fields.discard(key)
+        super().__setitem__(key, value)
+        self._changed.add(key)
+
+    def __delitem__(self, key):
+        self._load(key)
+        super().__delitem__(key)
+        self._changed.add(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        if key in self:
+            self._changed.add(key)
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self._load_all()
+        key, value = super().popitem()
+        self._changed.add(key)
+        return key, value
+
+    def clear(self):
+        self._load_all()
+        self._changed.update(super().keys())
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        for (key, value) in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load_all()
+        return super().__len__()
+
+    def keys(self):
+        self._load_all()
+        return super().keys()
+
+    def values(self):
+        self._load_all()
+        self._copy_all()
+        return super().values()
+
+    def items(self):
+        self._load_all()
+        self._copy_all()
+        return super().items()
+
+    def get_loaded(self):
+        """
+        Get loaded fields without loading lazy ones
+
+        :return: dict
+        """
+        return dict(super().items())
+
+    def get_projection(self):
+        """
+        Get MongoDB projection of loaded fields
+
+        :return: dict or None for all fields
+        """
+        if not self._lazy_fields:
+            return None
+        return {field: False for field in self._lazy_fields}
+
+    def set_saved(self, key, value):
+        """
+        Set value, that is already saved in MongoDB,
+        without marking it as changed
+
+        :param key: str
+        :param value: any value
+        :return:
+        """
+        self._lazy_fields.discard(key)
+        self._copies.pop(key, None)
+        super().__setitem__(key, value)
+        self._copy_value(key, value)
+
+    def merge(self, document):
+        """
+        Merge fresh document from MongoDB with changes of this data:
+        changed fields keep their values, others are got from document
+
+        :param document: dict, document of user
+        :return:
+        """
+        set_fields, unset_fields = self.get_changes()
+        changed = set(set_fields) | set(unset_fields)
+        # Changes in lists and dicts are saved as set values
+        self._changed.update(changed)
+        for (key, value) in document.items():
+            if key not in changed:
+                self.set_saved(key, value)
+        for key in list(super().keys()):
+            if key not in document and key not in changed:
+                super().__delitem__(key)
+                self._copies.pop(key, None)
+
+    def get_changes(self):
+        """
+        Get fields that were changed after loading or last saving
+
+        :return: dict of fields for $set and dict of fields for $unset
+        """
+        changed = set(self._changed)
+        for (key, value_copy) in self._copies.items():
+            if (super().__contains__(key) and
+                    super().__getitem__(key) != value_copy):
+                changed.add(key)
+        # _id of document can't be changed, version
+        # is increased on every saving
+        changed.discard('_id')
+        changed.discard('version')
+        set_fields = {}
+        unset_fields = {}
+        for key in changed:
+            if super().__contains__(key):
+                set_fields[key] = super().__getitem__(key)
+            else:
+                unset_fields[key] = ''
+        return set_fields, unset_fields
+
+    def save_changes(self):
+        """
+        Mark all changes as saved in MongoDB
+
+        :return:
+        """
+        keys = set(self._copies) | self._changed
+        self._changed = set()
+        self._copies = {}
+        # Plugins can keep links to lists and dicts and change them
+        # after saving, so copies are made again
+        for key in keys:
+            if super().__contains__(key):
+                self._copy_value(key, super().__getitem__(key))
+
+    def _load(self, key):
+        """
+        Load lazy field from MongoDB, if it isn't loaded yet
+
+        :param key: str
+        :return:
+        """
+        if key in self._lazy_fields:
+            self._load_keys([key])
+
+    def _load_all(self):
+        """
+        Load all lazy fields from MongoDB
+
+        :return:
+        """
+        if self._lazy_fields:
+            self._load_keys(list(self._lazy_fields))
+
+    def _load_keys(self, keys):
+        """
+        Load fields from MongoDB and save them without
+        marking as changed
+
+        :param keys: list of str
+        :return:
+        """
+        self._lazy_fields.difference_update(keys)
+        loaded = self._load_fields(keys)
+        for key in keys:
+            if key in loaded:
+                super().__setitem__(key, loaded[key])
+
+    def _copy_value(self, key, value):
+        """
+        Save copy of list or dict value for finding changes in it
+
+        :param key: str
+        :param value: any value
+        :return:
+        """
+        if (isinstance(value, (list, dict)) and key not in self._copies
+                and key not in self._changed):
+            self._copies[key] = copy.deepcopy(value)
+
+    def _copy_all(self):
+        """
+        Save copies of all list and dict values
+
+        :return:
+        """
+        for (key, value) in super().items():
+            self._copy_value(key, value)
+
+
+class UnitOfWork:
+    """
+    Changes of users, that were made while processing one message.
+    parse_message and plugins can update user several times,
+    but all changes are saved in MongoDB by one bulk_write.
+    """
+    def __init__(self, database):
+        """
+        Create new empty unit of work
+
+        :param database: Database object
+        """
+        self.database = database
+        self.users = []
+
+    def add(self, user):
+        """
+        Add user, whose changes will be saved on flush
+
+        :param user: User object
+        :return:
+        """
+        user.unit_of_work = self
+        if user not in self.users:
+            self.users.append(user)
+
+    def flush(self):
+        """
+        Save changes of all users in MongoDB
+
+        :return:
+        """
+        requests = []
+        changed_users = []
+        for user in self.users:
+            changes = user.get_changes()
+            if changes is not None:
+                requests.append(UpdateOne(user.get_filter(), changes))
+                changed_users.append(user)
+        if not requests:
+            return
+        result = self.database.collection.bulk_write(requests, ordered=False)
+        if result.matched_count < len(requests):
+            # Some users were changed by another process. It's unknown
+            # which ones, so all users are merged and saved again.
+            # Saving again of already saved fields doesn't change them.
+            for user in changed_users:
+                user.resolve_conflict()
+            return
+        for user in changed_users:
+            user.mark_saved()
+
+    def close(self):
+        """
+        Save all changes and return users to saving
+        on every update
+
+        :return:
+        """
+        try:
+            self.flush()
+        finally:
+            for user in self.users:
+                user.unit_of_work = None
+            self.users = []
@@ -10,11 +10,18 @@ Decorators and other functions for hooks.
 Copyright (C) 2015
 """
 import re
-import threading
+import functools
 
 import ross as ross_module
 
 from leonard.exceptions import catch_module_errors
+from leonard.utils import pop_phrase
+from leonard.utils.cache import LRUCache
+
+# Users often send the same phrases ("last note", "weather"),
+# so results of Ross are shared between messages.
+# Uncleaned text of message => dict of Ross params
+ross_cache = LRUCache(max_size=5000, ttl=3600)
 
 
 class Hook:
@@ -72,6 +79,10 @@ class MessageHook(Hook):
         self.case_sensitive = case_sensitive
         self.normalize = normalize
 
+        # Compile patterns once, not on every message
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self.patterns = [re.compile(regex, flags) for regex in regexes]
+
     @catch_module_errors
     def check(self, incoming_message, bot):
         """
@@ -86,18 +97,11 @@ class MessageHook(Hook):
         else:
             message_text = incoming_message.text
 
-        if not self.case_sensitive:
-            for regex in self.regexes:
-                match = re.match(regex, message_text, re.IGNORECASE)
-                if match:
-                    incoming_message.variables['regex_match'] = match.groups()
-                    return True
-        else:
-            for regex in self.regexes:
-                match = re.match(regex, message_text)
-                if match:
-                    incoming_message.variables['regex_match'] = match.groups()
-                    return True
+        for pattern in self.patterns:
+            match = pattern.match(message_text)
+            if match:
+                incoming_message.variables['regex_match'] = match.groups()
+                return True
 
         return False
 
@@ -156,7 +160,24 @@ class CommandHook(Hook):
         :param bot: Leonard object
         :return: True or False
         """
-        return incoming_message.text.lstrip().startswith('!' + self.command)
+        # Cleaned text has no '!', so command is got from original text
+        message_command = get_command(incoming_message.uncleaned_text)
+        return message_command == self.command.lower()
+
+
+def get_command(message_text):
+    """
+    Get command from message text
+
+    '!deploy leonard' => 'deploy'
+
+    :param message_text: str, original message text
+    :return: str, command without '!' or None
+    """
+    message_words = message_text.split(maxsplit=1)
+    if not message_words or not message_words[0].startswith('!'):
+        return None
+    return message_words[0][1:].lower()
 
 
 def command(command_text):
@@ -268,20 +289,10 @@ class KeywordsHook(Hook):
         :param bot: Leonard object
         :return: True or False
         """
-        if self.normalize:
-            message_text = incoming_message.normalizated_text
-        else:
-            message_text = incoming_message.text.lower()
-        message_words = message_text.split()
+        message_words = incoming_message.get_word_set(self.normalize)
         for keywords in self.keywords_list:
-            # Create set for keywords to have ability to delete
-            # keywords by words
-            keywords_set = set(keywords)
-            for word in keywords:
-                if word.lower() in message_words:
-                    keywords_set.remove(word)
-            # If set is empty, so all words found, return True
-            if keywords_set == set():
+            # If all keywords are in message words, return True
+            if all(word.lower() in message_words for word in keywords):
                 return True
         return False
 
@@ -342,17 +353,16 @@ class StartEndHook(Hook):
         :param bot: Leonard object
         :return: True or False
         """
-        if self.normalize:
-            message_text = incoming_message.normalizated_text
-        else:
-            message_text = incoming_message.text.lower()
-
+        message_words = incoming_message.get_words(self.normalize)
         for word in self.words:
-            if message_text.startswith(word) or message_text.endswith(word):
-                query = message_text.replace(word, '')
-                # Delete extra spaces
-                query = ' '.join(query.split())
-                incoming_message.variables['query'] = query
+            # Start or end should be whole words of message
+            phrase_words = word.lower().split()
+            length = len(phrase_words)
+            if (message_words[:length] == phrase_words or
+                    message_words[len(message_words) - length:] == phrase_words):
+                incoming_message.variables['query'] = pop_phrase(
+                    message_words, phrase_words
+                )
                 return True
         return False
 
@@ -410,8 +420,7 @@ class IntervalHook(Hook):
         :param incoming_message: not using
         :return:
         """
-        thread = threading.Thread(target=self.func, args=(bot, ))
-        thread.start()
+        return self.func(bot)
 
 
 def interval(interval_object):
@@ -425,6 +434,8 @@ def interval(interval_object):
     """
 
     def hook(func):
+        # Name of user's function is kept for scheduler stats
+        @functools.wraps(func)
         def wrapped(bot_object):
             """
             Wrapper around user's function
@@ -465,25 +476,58 @@ class RossHook(Hook):
         :param bot: Leonard object
         :return: True or False
         """
-        # Tip for refactoring:
-        # Right now ross is working no so slow, but when it will,
-        # try to get cached params from incoming_message.variables['ross']
-        message_data = ross_module.process_message(
-            incoming_message.uncleaned_text
-        )
-        if message_data is None:
+        message_params = parse_ross(incoming_message)
+        if not message_params:
+            return False
+        if not ross_params_match(self.params, message_params):
             return False
-        message_params = message_data.__dict__
-        for (param_name, param_value) in self.params.items():
-            if not (param_name in message_params
-                and message_params[param_name] == param_value):
-                return False
 
         # We should pass Ross data to plugin using message variables.
         incoming_message.variables['ross'] = message_params
         return True
 
 
+@catch_module_errors
+def parse_ross(incoming_message):
+    """
+    Parse message by Ross. Message is parsed once,
+    result is saved in incoming_message.ross_params
+    for all Ross hooks. Messages with the same text
+    get result from ross_cache.
+
+    :param incoming_message: IncomingMessage object
+    :return: dict of Ross params, empty if Ross didn't understand message
+    """
+    if incoming_message.ross_params is None:
+        text = incoming_message.uncleaned_text
+        message_params = ross_cache.get(text)
+        if message_params is None:
+            message_data = ross_module.process_message(text)
+            if message_data is None:
+                message_params = {}
+            else:
+                message_params = message_data.__dict__
+            ross_cache.set(text, message_params)
+        # Plugins can change params, so every message gets its own copy
+        incoming_message.ross_params = dict(message_params)
+    return incoming_message.ross_params
+
+
+def ross_params_match(hook_params, message_params):
+    """
+    Check, are all params of hook in message params
+
+    :param hook_params: dict, params of RossHook
+    :param message_params: dict, params of message from Ross
+    :return: True or False
+    """
+    for (param_name, param_value) in hook_params.items():
+        if not (param_name in message_params
+                and message_params[param_name] == param_value):
+            return False
+    return True
+
+
 def ross(**kwargs):
     """
     Hook for catching messages by defined Ross return params.
@@ -515,6 +559,40 @@ def ross(**kwargs):
     return hook
 
 
+def question_callback(callback_id):
+    """
+    Register function as callback for answers to plugin's questions.
+    Only callback_id is saved with question, so it must be
+    unique in plugin and shouldn't be changed.
+
+    :param callback_id: str, short id of callback, like 'add_note'
+    :return:
+    """
+
+    def hook(func):
+        # Function isn't wrapped, so questions with pickled
+        # callbacks asked before registration still work
+        func._leonard_question_callback = callback_id
+        return func
+
+    return hook
+
+
+def find_question_callbacks(plugin):
+    """
+    Find question callbacks in plugin module
+
+    :param plugin: Plugin object
+    :return: dict, callback id => function
+    """
+    callbacks = {}
+    for item in plugin.module.__dict__.values():
+        callback_id = getattr(item, '_leonard_question_callback', None)
+        if callback_id is not None:
+            callbacks[callback_id] = item
+    return callbacks
+
+
 def find_hooks(plugin):
     """
     Find hooks in plugin module
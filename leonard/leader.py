@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Election of leader between bot processes
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import os
+import time
+import uuid
+import socket
+import threading
+
+from leonard.utils import logger
+
+
+class LeaderElection:
+    """
+    Only one of bot processes (leader) holds lease in Redis.
+    Leader extends lease every renew_time, other processes try
+    to take it. If leader stops, lease is released at once;
+    if leader dies, lease expires after lease_time and
+    other process becomes leader.
+    """
+    def __init__(self, storage, key='leader:interval', lease_time=15):
+        """
+        Create new election, it starts working by run()
+
+        :param storage: Storage object
+        :param key: str, name of lease in Redis
+        :param lease_time: float, seconds before lease of died leader expires
+        """
+        self.storage = storage
+        self.key = key
+        self.lease_time = lease_time
+        self.renew_time = lease_time / 3
+        # Unique id of this process
+        self.owner = '{}:{}:{}'.format(socket.gethostname(), os.getpid(),
+                                       uuid.uuid4().hex)
+        # Time (from time.monotonic) until lease surely belongs to us
+        self._lease_until = 0.0
+        self._stopped = threading.Event()
+
+    def is_leader(self):
+        """
+        Check, is this process leader now.
+        Without Redis every process is leader.
+
+        :return: True or False
+        """
+        if not self.storage.redis:
+            return True
+        return time.monotonic() < self._lease_until
+
+    def hold(self):
+        """
+        Take or extend lease once
+
+        :return: True if this process is leader
+        """
+        was_leader = self.is_leader()
+        # Lease time is counted from request, so local time of lease
+        # ends before its expiration in Redis
+        started = time.monotonic()
+        try:
+            is_leader = self.storage.hold_lease(self.key, self.owner,
+                                                int(self.lease_time * 1000))
+        except Exception as error:
+            logger.error_message('Error while holding lease: \n' + str(error))
+            is_leader = False
+        if is_leader:
+            self._lease_until = started + self.lease_time
+        else:
+            self._lease_until = 0.0
+        if is_leader != was_leader:
+            logger.info_message('{} leader for {}'.format(
+                'Became' if is_leader else 'Lost', self.key
+            ))
+        return is_leader
+
+    def run(self):
+        """
+        Hold lease until stop(). Blocks current thread.
+
+        :return:
+        """
+        if not self.storage.redis:
+            logger.warning_message('Redis not available, every bot process '
+                                   'is leader for {}'.format(self.key))
+            return
+        while not self._stopped.is_set():
+            self.hold()
+            self._stopped.wait(self.renew_time)
+        self._lease_until = 0.0
+        self.storage.release_lease(self.key, self.owner)
+
+    def stop(self):
+        """
+        Stop holding lease and release it
+
+        :return:
+        """
+        self._stopped.set()
+
+    def __str__(self):
+        return 'Leader election <{}: {}>'.format(
+            self.key, 'leader' if self.is_leader() else 'follower'
+        )
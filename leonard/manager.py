@@ -10,11 +10,11 @@ Manager for plugins: importing and loading
 Copyright (C) 2015
 """
 
-import threading
 import importlib
 
 from leonard.utils import logger
-from leonard.hooks import find_hooks
+from leonard.hooks import find_hooks, find_question_callbacks
+from leonard.router import HookRouter
 from leonard.locale import find_locales
 from leonard.config import parse_config
 from leonard.exceptions import catch_module_errors
@@ -32,6 +32,11 @@ class PluginsManager:
         self.config = config
         self.bot = bot
         self.plugins = []
+        # Router is built from hooks of all plugins
+        # after plugins loading
+        self.router = None
+        # 'plugin.callback_id' => question callback function
+        self.question_callbacks = {}
 
     def load_plugins(self):
         """
@@ -42,6 +47,8 @@ class PluginsManager:
         plugin_names = self.config.installed_plugins
         for plugin_name in plugin_names:
             self.load_plugin(plugin_name)
+        self.build_router()
+        self.build_question_callbacks()
 
     def reload_plugins(self):
         """
@@ -51,6 +58,46 @@ class PluginsManager:
         """
         for plugin in self.plugins:
             plugin.reload_plugin()
+        self.build_router()
+        self.build_question_callbacks()
+
+    def build_router(self):
+        """
+        Create router for hooks of all loaded plugins
+
+        :return: HookRouter object
+        """
+        self.router = HookRouter(self.plugins)
+        logger.info_message('Built router for {} hooks'.format(
+            len(self.router.hooks)
+        ))
+        return self.router
+
+    def build_question_callbacks(self):
+        """
+        Collect question callbacks of all loaded plugins by their ids
+
+        :return: dict, 'plugin.callback_id' => function
+        """
+        question_callbacks = {}
+        for plugin in self.plugins:
+            short_name = plugin.name[len('plugins.'):]
+            for (callback_id, callback) in plugin.question_callbacks.items():
+                question_callbacks['{}.{}'.format(short_name,
+                                                  callback_id)] = callback
+        self.question_callbacks = question_callbacks
+        return question_callbacks
+
+    def get_question_callback(self, plugin_name, callback_id):
+        """
+        Get registered question callback of plugin
+
+        :param plugin_name: str, short plugin name, like 'notes'
+        :param callback_id: str, id of callback in plugin
+        :return: function or None
+        """
+        return self.question_callbacks.get('{}.{}'.format(plugin_name,
+                                                          callback_id))
 
     def load_plugin(self, plugin_name):
         """
@@ -72,6 +119,7 @@ class PluginsManager:
                         [], [])
         # Set plugin hooks and interval hooks by find_hooks function
         plugin.hooks, plugin.interval_hooks = find_hooks(plugin)
+        plugin.question_callbacks = find_question_callbacks(plugin)
         plugin.localization = find_locales(plugin)
         self.plugins.append(plugin)
 
@@ -109,6 +157,7 @@ class Plugin:
         self.bot = bot
         self.hooks = hooks
         self.interval_hooks = interval_hooks
+        self.question_callbacks = {}
         self.localization = None
 
     def __str__(self):
@@ -122,57 +171,8 @@ class Plugin:
         """
         self.module = importlib.reload(self.module)
         self.config = parse_config(self.module, 'plugin')
-        self.hooks = find_hooks(self)
-
-    def check_hooks(self, message):
-        """
-        Check incoming message for plugin's hooks
-
-        :param message: IncomingMessage object
-        :return: Hook object or None
-        """
-        threads = []
-        # Save found hooks in one object for all threads
-        found_hooks = FoundHooks()
-        for hook in self.hooks:
-            thread = threading.Thread(target=check_hook,
-                                      args=(hook, message,
-                                            found_hooks, self.bot))
-            thread.start()
-            threads.append(thread)
-
-        for thread in threads:
-            thread.join()
-
-        # Convert FoundHooks object to list with hooks
-        found_hooks = found_hooks.data
-        return found_hooks
-
-
-class FoundHooks:
-    """
-    Already found hooks while processing message.
-    It's important because we checking hooks in threads.
-    """
-    def __init__(self):
-        """
-        Create object for saving found hooks
-        """
-        self.data = []
-
-
-def check_hook(hook, message, found_hooks, bot):
-    """
-    Check hook and if it matched add it to found hooks
-
-    :param hook: Hook object
-    :param message: IncomingMessage object
-    :param found_hooks: FoundHooks object
-    :param bot: Leonard object
-    :return:
-    """
-    if hook.check(message, bot):
-        found_hooks.data.append(hook)
+        self.hooks, self.interval_hooks = find_hooks(self)
+        self.question_callbacks = find_question_callbacks(self)
 
 
 def import_plugin(plugin_name):
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+
+"""
+Matchers check all hooks of one type at once.
+Router builds matchers from hooks of all plugins on start,
+so for every message matcher does one scan for all hooks
+instead of checking hooks one by one.
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import re
+import heapq
+
+from leonard.utils import logger, pop_phrase
+from leonard.hooks import get_command, parse_ross, ross_params_match
+
+# Patterns with backreferences, named groups or global inline flags
+# can't be joined with other patterns: groups numbers and flags
+# will be broken in combined pattern.
+UNCOMBINABLE_PATTERN = re.compile(r'\\\d|\\g<|\(\?P[<=]|^\(\?[aiLmsux]+\)')
+
+
+def uncapture(regex):
+    """
+    Make all groups of regular expression non-capturing.
+    Capturing groups in big combined pattern make matching slow,
+    so groups are captured by hook's own pattern after matching.
+
+    'prime (\\d+)' => 'prime (?:\\d+)'
+
+    :param regex: str, regular expression without named groups
+    :return: str, regular expression without capturing groups
+    """
+    result = []
+    in_class = False
+    i = 0
+    while i < len(regex):
+        symbol = regex[i]
+        if symbol == '\\':
+            # Escaped symbol is never a group or a class
+            result.append(regex[i:i + 2])
+            i += 2
+            continue
+        result.append(symbol)
+        if in_class:
+            if symbol == ']':
+                in_class = False
+        elif symbol == '[':
+            in_class = True
+            # ']' right after '[' or '[^' is a part of the class
+            if regex[i + 1:i + 2] == '^':
+                i += 1
+                result.append('^')
+            if regex[i + 1:i + 2] == ']':
+                i += 1
+                result.append(']')
+        elif symbol == '(' and regex[i + 1:i + 2] != '?':
+            result.append('?:')
+        i += 1
+    return ''.join(result)
+
+
+class Matcher:
+    """
+    Basic class for matchers
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for hooks
+
+        :param hooks: list of Hook objects of one type,
+                      sorted by priority from high to low
+        """
+        self.hooks = hooks
+
+    def find(self, message, bot):
+        """
+        Find matched hooks in order of priority.
+        Next hook is searched only when caller asks for it,
+        because usually the first matched hook is enough.
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (Hook object, dict of message variables)
+        """
+        for hook in self.hooks:
+            if hook.check(message, bot):
+                yield hook, {}
+
+
+class CommandMatcher(Matcher):
+    """
+    Matcher for command hooks. Hooks are saved in dict by command,
+    so finding hook is one lookup for any number of commands.
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for command hooks
+
+        :param hooks: list of CommandHook objects,
+                      sorted by priority from high to low
+        """
+        super().__init__(hooks)
+        # Command => list of CommandHook objects
+        self.commands = {}
+        for hook in hooks:
+            self.commands.setdefault(hook.command.lower(), []).append(hook)
+
+    def find(self, message, bot):
+        """
+        Find command hooks for message in order of priority
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (CommandHook object, dict of message variables)
+        """
+        # Cleaned text has no '!', so command is got from original text
+        message_command = get_command(message.uncleaned_text)
+        if message_command is None:
+            return
+        for hook in self.commands.get(message_command, ()):
+            yield hook, {}
+
+
+class RegexMatcher(Matcher):
+    """
+    Matcher for message hooks. Patterns of all hooks with the same
+    settings are joined in one pattern, so one re.match call finds
+    the first (by priority) matched hook and its groups.
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for message hooks
+
+        :param hooks: list of MessageHook objects,
+                      sorted by priority from high to low
+        """
+        super().__init__(hooks)
+        # MessageHook object => position in self.hooks
+        self.positions = {}
+        # Hooks are grouped by settings, because hooks with different
+        # settings check different text with different flags.
+        groups = {}
+        # Hooks that can't be joined are checked one by one
+        uncombined_hooks = []
+        for (position, hook) in enumerate(hooks):
+            self.positions[hook] = position
+            if not hook.regexes:
+                continue
+            if any(UNCOMBINABLE_PATTERN.search(regex)
+                   for regex in hook.regexes):
+                uncombined_hooks.append(hook)
+                continue
+            settings = (hook.normalize, hook.case_sensitive)
+            if settings not in groups:
+                groups[settings] = RegexGroup(*settings)
+            groups[settings].add(hook)
+
+        self.groups = []
+        for group in groups.values():
+            if group.compile():
+                self.groups.append(group)
+            else:
+                uncombined_hooks.extend(group.hooks)
+        self.uncombined = Matcher(sorted(uncombined_hooks,
+                                         key=self.positions.get))
+
+    def find(self, message, bot):
+        """
+        Find matched message hooks in order of priority
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (MessageHook object, dict of message variables)
+        """
+        found = [group.find(message) for group in self.groups]
+        if self.uncombined.hooks:
+            found.append(self.uncombined.find(message, bot))
+        if len(found) == 1:
+            return found[0]
+        # heapq.merge has no key argument in Python 3.4, so found hooks
+        # are merged by their positions, which are unique
+        merged = heapq.merge(*[self._with_positions(found_hooks)
+                               for found_hooks in found])
+        return ((hook, variables) for (position, hook, variables) in merged)
+
+    def _with_positions(self, found_hooks):
+        """
+        Add positions of hooks to found hooks for merging
+
+        :param found_hooks: generator of (MessageHook object, dict of variables)
+        :return: generator of (position, MessageHook object, dict of variables)
+        """
+        for (hook, variables) in found_hooks:
+            yield self.positions[hook], hook, variables
+
+
+class RegexGroup:
+    """
+    Combined pattern for message hooks with the same settings
+    """
+    def __init__(self, normalize, case_sensitive):
+        """
+        Create empty group of hooks
+
+        :param normalize: bool, is hooks checking normalized text
+        :param case_sensitive: bool, is hooks checking text
+                               with case sensitive
+        """
+        self.normalize = normalize
+        self.case_sensitive = case_sensitive
+        self.hooks = []
+        # Number of marker group => (position of MessageHook in group,
+        #                            compiled pattern of hook)
+        self.markers = {}
+        self.parts = []
+        self.pattern = None
+
+    def add(self, hook):
+        """
+        Add hook patterns to group
+
+        :param hook: MessageHook object
+        :return:
+        """
+        for pattern in hook.patterns:
+            # Every pattern ends with empty marker group, which is
+            # the only group of combined pattern, so match.lastindex
+            # shows which pattern matched.
+            self.markers[len(self.parts) + 1] = (len(self.hooks), pattern)
+            self.parts.append('(?:{})()'.format(uncapture(pattern.pattern)))
+        self.hooks.append(hook)
+
+    def compile(self):
+        """
+        Compile combined pattern
+
+        :return: True if pattern compiled, else False
+        """
+        flags = 0 if self.case_sensitive else re.IGNORECASE
+        try:
+            self.pattern = re.compile('|'.join(self.parts), flags)
+        except re.error as error:
+            logger.warning_message("Can't combine message hooks: " +
+                                   str(error))
+            return False
+        return True
+
+    def find(self, message):
+        """
+        Find matched hooks of group in order of priority
+
+        :param message: IncomingMessage object
+        :return: generator of (MessageHook object, dict of message variables)
+        """
+        if self.normalize:
+            message_text = message.normalizated_text
+        else:
+            message_text = message.text
+        match = self.pattern.match(message_text)
+        if match is None:
+            return
+        position, pattern = self.markers[match.lastindex]
+        # Capture groups by matched pattern itself
+        match = pattern.match(message_text)
+        yield self.hooks[position], {'regex_match': match.groups()}
+
+        # The first matched hook was rejected, so check hooks after it
+        for hook in self.hooks[position + 1:]:
+            for pattern in hook.patterns:
+                match = pattern.match(message_text)
+                if match:
+                    yield hook, {'regex_match': match.groups()}
+                    break
+
+
+class KeywordsMatcher(Matcher):
+    """
+    Matcher for keywords hooks. It keeps inverted index:
+    word => keywords lists with that word, so checking
+    all keywords hooks costs as many index lookups
+    as there are words in the message.
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for keywords hooks
+
+        :param hooks: list of KeywordsHook objects,
+                      sorted by priority from high to low
+        """
+        super().__init__(hooks)
+        # Hooks with normalize=True and normalize=False check
+        # different texts, so they have different indexes:
+        # normalize => {word: list of keywords lists ids}
+        self.indexes = {True: {}, False: {}}
+        # Keywords list id => (position of hook, number of words)
+        self.keywords_lists = []
+        # Positions of hooks with empty keywords list, they
+        # match any message
+        self.always_matched = {True: set(), False: set()}
+        for (position, hook) in enumerate(hooks):
+            index = self.indexes[bool(hook.normalize)]
+            for keywords in hook.keywords_list:
+                words = set(word.lower() for word in keywords)
+                if not words:
+                    self.always_matched[bool(hook.normalize)].add(position)
+                    continue
+                keywords_id = len(self.keywords_lists)
+                self.keywords_lists.append((position, len(words)))
+                for word in words:
+                    index.setdefault(word, []).append(keywords_id)
+
+    def find(self, message, bot):
+        """
+        Find matched keywords hooks in order of priority
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (KeywordsHook object, dict of message variables)
+        """
+        positions = set()
+        for normalize in (True, False):
+            index = self.indexes[normalize]
+            if not index and not self.always_matched[normalize]:
+                continue
+            positions.update(self.always_matched[normalize])
+            message_words = message.get_word_set(normalize)
+            # Keywords list id => number of found words
+            found_words = {}
+            for word in message_words:
+                for keywords_id in index.get(word, ()):
+                    found_words[keywords_id] = (
+                        found_words.get(keywords_id, 0) + 1
+                    )
+                    position, words_count = self.keywords_lists[keywords_id]
+                    if found_words[keywords_id] == words_count:
+                        positions.add(position)
+
+        for position in sorted(positions):
+            yield self.hooks[position], {}
+
+
+class StartEndMatcher(Matcher):
+    """
+    Matcher for start_end hooks. Starts and ends of all hooks
+    are saved in two tries of words: the forward one for starts
+    and the reverse one for ends. Walking from the start
+    and from the end of message finds all matched hooks.
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for start_end hooks
+
+        :param hooks: list of StartEndHook objects,
+                      sorted by priority from high to low
+        """
+        super().__init__(hooks)
+        # normalize => root of trie. Node of trie is dict:
+        # word => next node, None => list of (position of hook,
+        #                                     position of phrase in hook)
+        self.starts = {True: {}, False: {}}
+        self.ends = {True: {}, False: {}}
+        # Words of every hook's phrases
+        self.phrases = []
+        for (position, hook) in enumerate(hooks):
+            normalize = bool(hook.normalize)
+            hook_phrases = []
+            for (phrase_position, phrase) in enumerate(hook.words):
+                phrase_words = phrase.lower().split()
+                hook_phrases.append(phrase_words)
+                phrase_id = (position, phrase_position)
+                add_to_trie(self.starts[normalize], phrase_words, phrase_id)
+                add_to_trie(self.ends[normalize], phrase_words[::-1],
+                            phrase_id)
+            self.phrases.append(hook_phrases)
+
+    def find(self, message, bot):
+        """
+        Find matched start_end hooks in order of priority
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (StartEndHook object, dict of message variables)
+        """
+        # Position of hook => position of first matched phrase in hook
+        found = {}
+        words = {}
+        for normalize in (True, False):
+            if not self.starts[normalize]:
+                continue
+            message_words = message.get_words(normalize)
+            words[normalize] = message_words
+            walks = ((self.starts[normalize], message_words),
+                     (self.ends[normalize], reversed(message_words)))
+            for (root, walk) in walks:
+                for phrase_id in walk_trie(root, walk):
+                    position, phrase_position = phrase_id
+                    if (position not in found or
+                            phrase_position < found[position]):
+                        found[position] = phrase_position
+
+        for position in sorted(found):
+            hook = self.hooks[position]
+            phrase_words = self.phrases[position][found[position]]
+            query = pop_phrase(words[bool(hook.normalize)], phrase_words)
+            yield hook, {'query': query}
+
+
+def add_to_trie(root, words, value):
+    """
+    Add value to trie node of words
+
+    :param root: dict, root node of trie
+    :param words: list of str, path in trie
+    :param value: value for the path
+    :return:
+    """
+    node = root
+    for word in words:
+        node = node.setdefault(word, {})
+    node.setdefault(None, []).append(value)
+
+
+def walk_trie(root, words):
+    """
+    Find values of all paths that are prefixes of words
+
+    :param root: dict, root node of trie
+    :param words: iterator of str
+    :return: generator of values
+    """
+    node = root
+    yield from node.get(None, ())
+    for word in words:
+        node = node.get(word)
+        if node is None:
+            return
+        yield from node.get(None, ())
+
+
+class RossMatcher(Matcher):
+    """
+    Matcher for Ross hooks. Message is parsed by Ross once,
+    than hooks are found in index by type and subtype of message.
+    """
+    def __init__(self, hooks):
+        """
+        Create matcher for Ross hooks
+
+        :param hooks: list of RossHook objects,
+                      sorted by priority from high to low
+        """
+        super().__init__(hooks)
+        # (type, subtype) => list of (position, RossHook object).
+        # If hook doesn't define type or subtype, it's None.
+        self.index = {}
+        for (position, hook) in enumerate(hooks):
+            key = (hook.params.get('type'), hook.params.get('subtype'))
+            self.index.setdefault(key, []).append((position, hook))
+
+    def find(self, message, bot):
+        """
+        Find matched Ross hooks in order of priority
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of (RossHook object, dict of message variables)
+        """
+        message_params = parse_ross(message)
+        if not message_params:
+            return
+        message_type = message_params.get('type')
+        message_subtype = message_params.get('subtype')
+        keys = {(message_type, message_subtype), (message_type, None),
+                (None, message_subtype), (None, None)}
+        found = []
+        for key in keys:
+            found.extend(self.index.get(key, ()))
+        found.sort(key=lambda f: f[0])
+        for (position, hook) in found:
+            if ross_params_match(hook.params, message_params):
+                yield hook, {'ross': message_params}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+Router for hooks: choosing plugin's hook for incoming message
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import heapq
+import threading
+
+from leonard.matchers import (CommandMatcher, RegexMatcher,
+                              KeywordsMatcher, StartEndMatcher, RossMatcher)
+
+# Matchers for hooks types that can be checked by one scan
+# for all hooks of that type. Hooks of other types
+# are checked one by one.
+MATCHERS = {
+    'command': CommandMatcher,
+    'message': RegexMatcher,
+    'keywords': KeywordsMatcher,
+    'start_end': StartEndMatcher,
+    'ross': RossMatcher
+}
+
+
+class HookRouter:
+    """
+    Router is built once from hooks of all plugins.
+    It checks hooks from the most appropriate to the least
+    and stops on the first matched hook. Hooks of some types
+    are checked by matchers with one scan for all hooks
+    of that type.
+    """
+    def __init__(self, plugins):
+        """
+        Create new router for plugins' hooks
+
+        :param plugins: list of Plugin objects
+        """
+        hooks = []
+        for plugin in plugins:
+            hooks.extend(plugin.hooks)
+        # Sort hooks by priority of plugin and priority of hook,
+        # so the first matched hook is the most appropriate.
+        # Commands are explicit, so they are checked before
+        # hooks of any other type.
+        # Sorting is stable, so hooks with the same priorities
+        # keep order of plugins loading.
+        hooks.sort(
+            key=lambda h: (
+                h.type == 'command',
+                h.plugin.config.priority,
+                h.priority
+            ),
+            reverse=True
+        )
+        self.hooks = hooks
+        # Hook object => position in sorted hooks
+        self.positions = {}
+        for (position, hook) in enumerate(hooks):
+            self.positions[hook] = position
+        # Hook type => Matcher object
+        self.matchers = {}
+        for (hook_type, matcher_class) in MATCHERS.items():
+            type_hooks = [hook for hook in hooks if hook.type == hook_type]
+            if type_hooks:
+                self.matchers[hook_type] = matcher_class(type_hooks)
+        # Steps of routing in order of priority: hooks without matcher
+        # are checked one by one, matchers start searching
+        # from position of their first hook.
+        # List of (position, Hook object or None, Matcher object or None)
+        self.steps = []
+        for hook in hooks:
+            if hook.type not in self.matchers:
+                self.steps.append((self.positions[hook], hook, None))
+        for matcher in self.matchers.values():
+            self.steps.append((self.positions[matcher.hooks[0]],
+                               None, matcher))
+        self.steps.sort(key=lambda step: step[0])
+        self.stats = RouterStats()
+
+    def route(self, message, bot):
+        """
+        Find matched hooks for message in order of priority.
+        It's a generator: next hook is checked only if previous
+        matched hook was rejected by caller (for example,
+        plugin raised NextHook).
+
+        :param message: IncomingMessage object
+        :param bot: Leonard object
+        :return: generator of Hook objects
+        """
+        # Matchers find their hooks by one scan for all hooks, so
+        # we get the first found hook from every matcher and yield it
+        # when all hooks with higher priority were checked.
+        # Matcher starts searching only when routing reaches
+        # its first hook, so slow matchers (like Ross) don't work
+        # if hook with higher priority was found.
+        stats = {'evaluated': 0}
+        found = []
+        try:
+            for (position, hook, matcher) in self.steps:
+                while found and found[0][0] < position:
+                    hook_found, found_hooks = self._pop_found(found, message)
+                    yield hook_found
+                    # Found hook was rejected, so add next
+                    # hook from the same matcher
+                    self._add_found(found, found_hooks, stats)
+                if matcher is not None:
+                    self._add_found(found, matcher.find(message, bot), stats)
+                    continue
+                stats['evaluated'] += 1
+                if hook.check(message, bot):
+                    yield hook
+
+            while found:
+                hook_found, found_hooks = self._pop_found(found, message)
+                yield hook_found
+                self._add_found(found, found_hooks, stats)
+        finally:
+            self.stats.add(stats['evaluated'])
+
+    def _add_found(self, found, found_hooks, stats):
+        """
+        Add next hook found by matcher to heap of found hooks
+
+        :param found: list, heap of found hooks
+        :param found_hooks: generator of (Hook object, dict of variables)
+        :param stats: dict with counters for message
+        :return:
+        """
+        found_hook = next(found_hooks, None)
+        if found_hook is None:
+            return
+        stats['evaluated'] += 1
+        hook, variables = found_hook
+        heapq.heappush(found, (self.positions[hook], hook,
+                               variables, found_hooks))
+
+    def _pop_found(self, found, message):
+        """
+        Get found hook with the highest priority
+        and set message variables from matcher
+
+        :param found: list, heap of found hooks
+        :param message: IncomingMessage object
+        :return: Hook object and generator of next found hooks
+        """
+        position, hook, variables, found_hooks = heapq.heappop(found)
+        message.variables.update(variables)
+        return hook, found_hooks
+
+
+class RouterStats:
+    """
+    Counters of router work. Router is used from many
+    threads, so all counters are changed under lock.
+    """
+    def __init__(self):
+        """
+        Create empty counters
+        """
+        self.messages = 0
+        self.hooks_evaluated = 0
+        self.last_hooks_evaluated = 0
+        self.max_hooks_evaluated = 0
+        self._lock = threading.Lock()
+
+    def add(self, hooks_evaluated):
+        """
+        Save number of hooks that were checked for one message
+
+        :param hooks_evaluated: int
+        :return:
+        """
+        with self._lock:
+            self.messages += 1
+            self.hooks_evaluated += hooks_evaluated
+            self.last_hooks_evaluated = hooks_evaluated
+            if hooks_evaluated > self.max_hooks_evaluated:
+                self.max_hooks_evaluated = hooks_evaluated
+
+    @property
+    def hooks_per_message(self):
+        """
+        Average number of checked hooks per message
+
+        :return: float
+        """
+        if not self.messages:
+            return 0.0
+        return self.hooks_evaluated / self.messages
+
+    def __str__(self):
+        return ('{} messages, {:.2f} hooks evaluated per message '
+                '(last: {}, max: {})'.format(self.messages,
+                                              self.hooks_per_message,
+                                              self.last_hooks_evaluated,
+                                              self.max_hooks_evaluated))
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler for interval hooks
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import time
+import heapq
+import itertools
+import threading
+
+from leonard.utils import logger
+
+
+class IntervalScheduler:
+    """
+    Runs interval hooks in workers pool. Hooks are kept in heap
+    by time of their next run, so scheduler thread sleeps until
+    the nearest run instead of checking all hooks every second.
+    Hook isn't run again while its previous run isn't finished.
+    If there is leader election, hooks run only in leader process.
+    """
+    def __init__(self, bot, pool, leader=None):
+        """
+        Create new scheduler, it starts working by run()
+
+        :param bot: Leonard object, it's passed to hooks
+        :param pool: WorkerPool object for running hooks
+        :param leader: LeaderElection object or None
+                       for running hooks in every process
+        """
+        self.bot = bot
+        self.pool = pool
+        self.leader = leader
+        # Heap of (time of next run, number of adding, IntervalHook object)
+        self.heap = []
+        # Number of adding keeps order of hooks with the same time
+        # and hooks are never compared
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        # Lock for runs of hooks and their counters
+        self._lock = threading.Lock()
+        # Hooks, which are running now
+        self._running = set()
+        # IntervalHook object => dict of counters
+        self._stats = {}
+
+    def add(self, hook):
+        """
+        Add interval hook to schedule
+
+        :param hook: IntervalHook object
+        :return:
+        """
+        # Job from schedule module calculates time of the next run
+        hook.interval._schedule_next_run()
+        with self._lock:
+            self._stats[hook] = {'runs': 0, 'skipped': 0, 'not_leader': 0,
+                                 'last_lag': 0.0, 'max_lag': 0.0}
+        with self._condition:
+            self._push(hook)
+            # Wake up scheduler, new hook may be the nearest
+            self._condition.notify()
+
+    def run(self):
+        """
+        Run hooks until stop(). Blocks current thread.
+
+        :return:
+        """
+        while True:
+            with self._condition:
+                hook, lag = self._wait_next_hook()
+            if hook is None:
+                return
+            # Pool may block on full queue, so hook is submitted
+            # without lock
+            self._start(hook, lag)
+
+    def _wait_next_hook(self):
+        """
+        Sleep until time of the nearest hook and schedule its next run.
+        Must be called under lock.
+
+        :return: IntervalHook object and its lag in seconds
+                 or None and None if scheduler is stopped
+        """
+        while not self._stopped:
+            if not self.heap:
+                self._condition.wait()
+                continue
+            now = time.time()
+            if self.heap[0][0] > now:
+                self._condition.wait(self.heap[0][0] - now)
+                continue
+            next_run, number, hook = heapq.heappop(self.heap)
+            # Time of the next run is calculated from current time,
+            # so late hook doesn't run many times in a row
+            hook.interval.last_run = hook.interval.next_run
+            hook.interval._schedule_next_run()
+            self._push(hook)
+            return hook, now - next_run
+        return None, None
+
+    def stop(self):
+        """
+        Stop scheduler, running hooks are not interrupted
+
+        :return:
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _push(self, hook):
+        """
+        Add hook to heap by time of its next run
+
+        :param hook: IntervalHook object
+        :return:
+        """
+        heapq.heappush(self.heap, (hook.interval.next_run.timestamp(),
+                                   next(self._counter), hook))
+
+    def _start(self, hook, lag):
+        """
+        Submit hook to workers pool if its previous run is finished
+
+        :param hook: IntervalHook object
+        :param lag: float, seconds between planned and real start
+        :return:
+        """
+        with self._lock:
+            stats = self._stats[hook]
+            if self.leader is not None and not self.leader.is_leader():
+                stats['not_leader'] += 1
+                return
+            if hook in self._running:
+                stats['skipped'] += 1
+                logger.warning_message('Previous run of {} is not finished, '
+                                       'skipping it'.format(hook.func.__name__))
+                return
+            stats['runs'] += 1
+            stats['last_lag'] = lag
+            stats['max_lag'] = max(stats['max_lag'], lag)
+            self._running.add(hook)
+        self.pool.submit(self._call, hook)
+
+    def _call(self, hook):
+        """
+        Call hook in worker
+
+        :param hook: IntervalHook object
+        :return:
+        """
+        try:
+            hook.call(self.bot)
+        finally:
+            with self._lock:
+                self._running.discard(hook)
+
+    def stats(self):
+        """
+        Get counters of hooks runs
+
+        :return: dict, name of hook function => dict with numbers of runs,
+                 skipped runs, runs skipped because other process
+                 is leader, last and max lag in seconds
+        """
+        with self._lock:
+            return {hook.func.__name__: dict(stats)
+                    for (hook, stats) in self._stats.items()}
+
+    def __str__(self):
+        return 'Scheduler <{} hooks, {} running>'.format(len(self.heap),
+                                                        len(self._running))
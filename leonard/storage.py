@@ -13,9 +13,26 @@ Copyright (C) 2015
 import json
 
 from redis import StrictRedis
+from redis.exceptions import WatchError
 
 from leonard.utils import logger
 
+# Take ids of values with time before ARGV[1] from schedule (KEYS[1]),
+# get values by ids from hash (KEYS[2]) and delete them from both keys.
+# Number of ids is limited by ARGV[2], because unpack() has limit
+# of arguments.
+POP_SCHEDULED_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                       'LIMIT', 0, ARGV[2])
+if #ids == 0 then
+    return {}
+end
+redis.call('ZREM', KEYS[1], unpack(ids))
+local values = redis.call('HMGET', KEYS[2], unpack(ids))
+redis.call('HDEL', KEYS[2], unpack(ids))
+return values
+"""
+
 
 class Storage:
     def __init__(self, bot, config_prefix):
@@ -45,6 +62,21 @@ class Storage:
             logger.error_message(str(error))
             self.redis = None
 
+        # Script is sent to Redis on the first call
+        if self.redis:
+            self._pop_scheduled_script = self.redis.register_script(
+                POP_SCHEDULED_SCRIPT
+            )
+
+        # Number of raw messages from adapter saved for every user
+        self.last_messages_count = int(bot.config.get(
+            '{}LAST_MESSAGES_COUNT'.format(config_prefix), '10'
+        ))
+        # Seconds for user to answer the question
+        self.question_ttl = int(bot.config.get(
+            '{}QUESTION_TTL'.format(config_prefix), '3600'
+        ))
+
     def get(self, key, default_value=None):
         """
         Get value from redis storage
@@ -112,3 +144,217 @@ class Storage:
         """
         json_value = json.dumps(value)
         return self.set(key, json_value)
+
+    def push_json(self, key, value, max_length):
+        """
+        Dump value into json and add it to the begin of list in Redis.
+        List is trimmed to max_length, so the oldest values are deleted.
+
+        :param key: string
+        :param value: list/dict
+        :param max_length: int, max number of values in list
+        :return:
+        """
+        if not self.redis:
+            logger.warning_message("{} key didn't save in storage".format(
+                key
+            ))
+            return None
+
+        pipeline = self.redis.pipeline()
+        pipeline.lpush(key, json.dumps(value))
+        pipeline.ltrim(key, 0, max_length - 1)
+        return pipeline.execute()
+
+    def get_json_list(self, key):
+        """
+        Get list from Redis and parse JSON in every value
+
+        :param key: string
+        :return: list of lists/dicts, from the newest to the oldest
+        """
+        if not self.redis:
+            logger.warning_message("Redis not available for {} key".format(
+                key
+            ))
+            return []
+
+        return [json.loads(value.decode('utf-8'))
+                for value in self.redis.lrange(key, 0, -1)]
+
+    def save_last_message(self, adapter_id, raw_message):
+        """
+        Save raw message from adapter to ring of user's last messages.
+        Raw message is different in every message, so it isn't
+        saved in MongoDB.
+
+        :param adapter_id: str, user id from adapter
+        :param raw_message: dict, message data from adapter
+        :return:
+        """
+        return self.push_json('last_messages:{}'.format(adapter_id),
+                              raw_message, self.last_messages_count)
+
+    def get_last_messages(self, adapter_id):
+        """
+        Get raw messages of user from adapter
+
+        :param adapter_id: str, user id from adapter
+        :return: list of dicts, from the newest to the oldest
+        """
+        return self.get_json_list('last_messages:{}'.format(adapter_id))
+
+    def save_question(self, adapter_id, callback, plugin_name, payload=None):
+        """
+        Save question that waits for user's answer.
+        Question is deleted by Redis if user didn't answer it in
+        question_ttl seconds.
+
+        :param adapter_id: str, user id from adapter
+        :param callback: str, id of question callback in plugin
+        :param plugin_name: str, name of plugin that asks question
+        :param payload: list/dict, data for callback or None
+        :return:
+        """
+        if not self.redis:
+            logger.warning_message("Question for {} didn't save in "
+                                   "storage".format(adapter_id))
+            return None
+
+        key = 'question:{}'.format(adapter_id)
+        question = {'callback': callback, 'plugin': plugin_name}
+        if payload is not None:
+            question['payload'] = json.dumps(payload)
+        pipeline = self.redis.pipeline()
+        pipeline.delete(key)
+        pipeline.hmset(key, question)
+        pipeline.expire(key, self.question_ttl)
+        return pipeline.execute()
+
+    def pop_question(self, adapter_id):
+        """
+        Get question that waits for user's answer and delete it,
+        so every question is answered only once
+
+        :param adapter_id: str, user id from adapter
+        :return: dict with callback, plugin and payload or None
+                 if there is no question. Callback is bytes, because
+                 questions asked before callbacks registration
+                 have pickled callbacks.
+        """
+        if not self.redis:
+            return None
+
+        key = 'question:{}'.format(adapter_id)
+        pipeline = self.redis.pipeline()
+        pipeline.hgetall(key)
+        pipeline.delete(key)
+        question = pipeline.execute()[0]
+        if not question:
+            return None
+        payload = question.get(b'payload')
+        if payload is not None:
+            payload = json.loads(payload.decode('utf-8'))
+        return {'callback': question[b'callback'],
+                'plugin': question[b'plugin'].decode('utf-8'),
+                'payload': payload}
+
+    def add_scheduled(self, key, value, timestamp):
+        """
+        Add value to schedule, it will be returned by pop_scheduled
+        after timestamp. Values are saved in '<key>:items' hash,
+        their ids are sorted by timestamp in '<key>:schedule' sorted set.
+
+        :param key: str, name of schedule
+        :param value: list/dict
+        :param timestamp: float, UTC time in seconds
+        :return: int, id of value or None if Redis isn't available
+        """
+        if not self.redis:
+            logger.warning_message("{} value didn't save in storage".format(
+                key
+            ))
+            return None
+
+        value_id = self.redis.incr('{}:next_id'.format(key))
+        pipeline = self.redis.pipeline()
+        pipeline.hset('{}:items'.format(key), value_id, json.dumps(value))
+        pipeline.zadd('{}:schedule'.format(key), timestamp, value_id)
+        pipeline.execute()
+        return value_id
+
+    def pop_scheduled(self, key, timestamp, count=1000):
+        """
+        Get values of schedule with time before timestamp and delete them.
+        Values are taken from schedule and deleted by one Lua script,
+        so every value is returned only once, even if many bots
+        read the schedule, and values are never left without schedule.
+
+        :param key: str, name of schedule
+        :param timestamp: float, UTC time in seconds
+        :param count: int, max number of values, other values
+                      are returned by the next call
+        :return: list of lists/dicts, from the earliest
+        """
+        if not self.redis:
+            return []
+
+        values = self._pop_scheduled_script(
+            keys=['{}:schedule'.format(key), '{}:items'.format(key)],
+            args=[timestamp, count]
+        )
+        return [json.loads(value.decode('utf-8'))
+                for value in values if value is not None]
+
+    def hold_lease(self, key, owner, lease_time):
+        """
+        Take lease if nobody holds it or extend lease of owner.
+        Lease is deleted by Redis after lease_time if owner
+        didn't extend it.
+
+        :param key: str, name of lease
+        :param owner: str, unique id of lease holder
+        :param lease_time: int, milliseconds
+        :return: True if owner holds lease now
+        """
+        if not self.redis:
+            return False
+
+        if self.redis.set(key, owner, px=lease_time, nx=True):
+            return True
+        with self.redis.pipeline() as pipeline:
+            try:
+                # Lease is extended only if it wasn't changed
+                # after checking of owner
+                pipeline.watch(key)
+                if pipeline.get(key) != owner.encode('utf-8'):
+                    return False
+                pipeline.multi()
+                pipeline.pexpire(key, lease_time)
+                pipeline.execute()
+                return True
+            except WatchError:
+                return False
+
+    def release_lease(self, key, owner):
+        """
+        Delete lease if owner holds it, so other holder can take it
+        without waiting for its expiration
+
+        :param key: str, name of lease
+        :param owner: str, unique id of lease holder
+        :return:
+        """
+        if not self.redis:
+            return None
+
+        with self.redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(key)
+                if pipeline.get(key) != owner.encode('utf-8'):
+                    return None
+                pipeline.multi()
+                pipeline.delete(key)
+                return pipeline.execute()
+            except WatchError:
+                return None
@@ -48,6 +48,42 @@ class NextHook(BaseException):
     pass
 
 
+# Patterns and indexes for clean_message and normalize_message,
+# they are built once on import.
+# Every punctuation mark is replaced by space in one pass
+SYMBOLS_PATTERN = re.compile('[{}]'.format(
+    re.escape(''.join(REPLACE_SYMBOLS))
+))
+
+
+def _compile_replace_words(words):
+    """
+    Build indexes of REPLACE_WORDS for normalize_message
+
+    :param words: list of str, words and phrases for deleting
+    :return: dict, first word of phrase => list of phrases' indexes and
+             dict, beginning of word => list of words with that beginning
+    """
+    first_words = {}
+    beginnings = {}
+    for (index, phrase) in enumerate(words):
+        phrase_words = phrase.split(' ')
+        first_words.setdefault(phrase_words[0], []).append(index)
+        for word in phrase_words:
+            for end in range(1, len(word)):
+                beginnings.setdefault(word[:end], set()).add(word)
+    return first_words, beginnings
+
+
+# Words should be separate, so they are surrounded by spaces
+REPLACE_PHRASES = [' ' + word + ' ' for word in REPLACE_WORDS]
+# First word of phrase => list of indexes in REPLACE_WORDS,
+# beginning of word => set of words from REPLACE_WORDS
+REPLACE_FIRST_WORDS, REPLACE_BEGINNINGS = _compile_replace_words(
+    REPLACE_WORDS
+)
+
+
 def clean_message(message_text):
     """
     Delete punctuation marks and lowercase message text
@@ -57,19 +93,16 @@ def clean_message(message_text):
     :param message_text: str, original message
     :return: str, cleaned message_text
     """
-    # First, make all letters lower.
-    # "hey, leonard, who is taylor swift"
-    message_text = message_text.lower()
-
-    # Delete punctuation marks
-    for symbol in REPLACE_SYMBOLS:
-        message_text = message_text.replace(symbol, ' ')
+    # First, make all letters lower and delete punctuation marks.
+    # "hey  leonard  who is taylor swift"
+    message_text = SYMBOLS_PATTERN.sub(' ', message_text.lower())
 
     # Delete extra spaces
     message_text = ' '.join(message_text.split())
 
     return message_text
 
+
 def normalize_message(message_text):
     """
     Normalize message to make catching hooks easier.
@@ -87,10 +120,21 @@ def normalize_message(message_text):
     # deleting words easier
     message_text = " " + message_text + " "
 
-    for word in REPLACE_WORDS:
-        # Word should be separate
-        word = " " + word + " "
-        message_text = message_text.replace(word, '')
+    # Only phrases that begin with a word of message are deleted,
+    # in order of REPLACE_WORDS. Deleting of phrase joins its
+    # neighbours: "weather for tomorrow" => "weathertomorrow".
+    # If joined words could become a word from REPLACE_WORDS,
+    # all phrases are deleted one by one.
+    message_words = set(message_text.split(' '))
+    if _can_join_replace_word(message_words):
+        indexes = range(len(REPLACE_PHRASES))
+    else:
+        indexes = []
+        for first_word in message_words.intersection(REPLACE_FIRST_WORDS):
+            indexes.extend(REPLACE_FIRST_WORDS[first_word])
+        indexes.sort()
+    for index in indexes:
+        message_text = message_text.replace(REPLACE_PHRASES[index], '')
 
     # If there are extra spaces, delete it
     message_text = ' '.join(message_text.split())
@@ -98,6 +142,23 @@ def normalize_message(message_text):
     return message_text
 
 
+def _can_join_replace_word(message_words):
+    """
+    Check, could joined words of message become a word from REPLACE_WORDS.
+    It's possible only if message has beginning and ending of that word:
+    "h for i" => "hi".
+
+    :param message_words: set of str, words of message
+    :return: True or False
+    """
+    for beginning in message_words.intersection(REPLACE_BEGINNINGS):
+        for word in REPLACE_BEGINNINGS[beginning]:
+            for start in range(len(beginning), len(word)):
+                if word[start:] in message_words:
+                    return True
+    return False
+
+
 def keywords_from_words(words):
     """
     Generate a list for keywords hook from single words.
@@ -136,6 +197,30 @@ def pop_words(message_text, words):
     return ' '.join(message_words)
 
 
+def pop_phrase(message_words, phrase_words):
+    """
+    Remove all occurrences of phrase from message words
+
+    ['gif', 'funny', 'cats']; ['gif'] => 'funny cats'
+
+    :param message_words: list of str, words of message
+    :param phrase_words: list of str, words of phrase
+    :return: str, message text without phrase
+    """
+    length = len(phrase_words)
+    if not length:
+        return ' '.join(message_words)
+    result = []
+    i = 0
+    while i < len(message_words):
+        if message_words[i:i + length] == phrase_words:
+            i += length
+        else:
+            result.append(message_words[i])
+            i += 1
+    return ' '.join(result)
+
+
 def find_numbers(message_text):
     """
     Find all numbers in message words
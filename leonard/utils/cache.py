@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+Thread-safe in-memory cache with LRU eviction and TTL
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import time
+import threading
+import collections
+
+
+class LRUCache:
+    """
+    Bounded cache: when it's full, the least recently used value
+    is evicted. Values older than ttl seconds are not returned.
+    Cache is used from workers' threads, so all operations
+    are made under lock.
+    """
+    def __init__(self, max_size=1000, ttl=None):
+        """
+        Create new empty cache
+
+        :param max_size: int, max number of values in cache
+        :param ttl: int or float, seconds of value's life, None - forever
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        # key => (time of saving, value), ordered from old to recent
+        self._values = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Get value from cache and mark it as recently used
+
+        :param key: hashable object
+        :param default: returned if there is no fresh value for key
+        :return: cached value or default
+        """
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is None:
+                self.misses += 1
+                return default
+            saved, value = cached
+            if self.ttl is not None and time.time() - saved > self.ttl:
+                del self._values[key]
+                self.misses += 1
+                self.evictions += 1
+                return default
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Save value to cache, evict the least recently used
+        values if cache is full
+
+        :param key: hashable object
+        :param value: any object
+        :return:
+        """
+        with self._lock:
+            self._values[key] = (time.time(), value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Delete value from cache if it's there
+
+        :param key: hashable object
+        :return:
+        """
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        """
+        Delete all values from cache, counters are not changed
+
+        :return:
+        """
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
+
+    def stats(self):
+        """
+        Get cache counters
+
+        :return: dict with size, hits, misses, evictions and hit rate
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._values),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0
+            }
+
+    def __str__(self):
+        return ('Cache: {size}/{max_size} values, {hits} hits, '
+                '{misses} misses, {evictions} evictions, '
+                '{hit_rate:.0%} hit rate'.format(**self.stats()))
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pool of worker threads for processing incoming messages
+
+@author: Seva Zhidkov
+@contact: zhidkovseva@gmail.com
+@license: Creative Commons Attribution-NonCommercial 4.0 International Public License
+
+Copyright (C) 2015
+"""
+
+import time
+import zlib
+import queue
+import itertools
+import threading
+
+from leonard.utils import logger
+
+
+class WorkerPool:
+    """
+    Fixed number of threads (lanes), every lane gets tasks
+    from its own bounded queue. Tasks with the same key always
+    go to the same lane, so they run one by one in order
+    of adding, while tasks with different keys run in parallel.
+    If lane's queue is full, adding of new task waits until
+    the lane takes task from queue, so adapter can't get
+    messages faster than bot answers them.
+    """
+    def __init__(self, workers=8, queue_size=100, name='worker'):
+        """
+        Create new pool, workers are started by start()
+
+        :param workers: int, number of worker threads
+        :param queue_size: int, max number of waiting tasks in all lanes
+        :param name: str, prefix of workers' threads names
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.name = name
+        # Every lane has equal part of queue size
+        lane_size = max(1, queue_size // workers)
+        self.queues = [queue.Queue(maxsize=lane_size)
+                       for i in range(workers)]
+        # Tasks without key are distributed between lanes in turn
+        self._next_lane = itertools.cycle(range(workers))
+        self.threads = []
+        # Counters for pool stats, changed under lock
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._busy_time = 0.0
+        self._processed = 0
+        self._started = None
+
+    def start(self):
+        """
+        Start worker threads
+
+        :return:
+        """
+        self._started = time.time()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work,
+                args=(self.queues[i], ),
+                name='{}-{}'.format(self.name, i)
+            )
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, func, *args, key=None):
+        """
+        Add new task to lane's queue. Blocks while queue is full.
+
+        :param func: function that will be called in worker
+        :param args: arguments for func
+        :param key: str, tasks with the same key run in one lane
+                    in order of adding. For example, adapter_id.
+        :return:
+        """
+        lane_queue = self.queues[self.get_lane(key)]
+        if lane_queue.full():
+            logger.warning_message('Queue is full, waiting for workers:',
+                                   self)
+        lane_queue.put((func, args))
+
+    def get_lane(self, key):
+        """
+        Get number of lane for tasks with that key
+
+        :param key: str or None
+        :return: int
+        """
+        if key is None:
+            return next(self._next_lane)
+        # Python's hash() of str is different in every process,
+        # crc32 is stable and fast enough
+        return zlib.crc32(str(key).encode('utf-8')) % self.workers
+
+    def join(self):
+        """
+        Wait until all queued tasks are done
+
+        :return:
+        """
+        for lane_queue in self.queues:
+            lane_queue.join()
+
+    def stop(self):
+        """
+        Wait for all queued tasks and stop worker threads
+
+        :return:
+        """
+        for lane_queue in self.queues[:len(self.threads)]:
+            lane_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _work(self, lane_queue):
+        """
+        Worker loop: get task from lane's queue and run it
+
+        :param lane_queue: Queue object of worker's lane
+        :return:
+        """
+        while True:
+            task = lane_queue.get()
+            # None is a signal for stopping worker
+            if task is None:
+                lane_queue.task_done()
+                return
+            func, args = task
+            with self._lock:
+                self._busy += 1
+            started = time.time()
+            try:
+                func(*args)
+            except (SystemExit, KeyboardInterrupt):
+                raise
+            except BaseException as error:
+                # Worker must not stop because of task, else tasks
+                # of its lane are never taken from queue.
+                # Plugins' signals, like NextHook, are BaseException.
+                logger.error_message('Error in {}: \n{}'.format(
+                    threading.current_thread().name, repr(error)
+                ))
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_time += time.time() - started
+                    self._processed += 1
+                lane_queue.task_done()
+
+    def stats(self):
+        """
+        Get current state of the pool
+
+        :return: dict with queue depth and workers utilisation
+        """
+        with self._lock:
+            busy = self._busy
+            busy_time = self._busy_time
+            processed = self._processed
+        if self._started is not None:
+            uptime = time.time() - self._started
+        else:
+            uptime = 0
+        if uptime and self.workers:
+            utilisation = busy_time / (uptime * self.workers)
+        else:
+            utilisation = 0.0
+        lanes_depth = [lane_queue.qsize() for lane_queue in self.queues]
+        return {
+            'queue_depth': sum(lanes_depth),
+            'lanes_depth': lanes_depth,
+            'queue_size': self.queue_size,
+            'workers': self.workers,
+            'busy_workers': busy,
+            'processed': processed,
+            'utilisation': utilisation
+        }
+
+    def __str__(self):
+        stats = self.stats()
+        return ('Pool <{}>: {queue_depth}/{queue_size} queued, '
+                '{busy_workers}/{workers} busy, '
+                '{utilisation:.0%} utilisation'.format(self.name, **stats))
@@ -102,6 +102,7 @@ def search_message(message, bot):
     bot.ask_question(answer, search_choose_location_callback, 'location')
 
 
+@leonard.hooks.question_callback('search_choose_location')
 def search_choose_location_callback(message, bot):
     # Search query was saved when Ross have detected search place message
     query = message.sender.data['place_query']
@@ -135,6 +136,7 @@ def explore_message(message, bot):
         return
 
 
+@leonard.hooks.question_callback('explore_choose_location')
 def explore_choose_location_callback(message, bot):
     if not (message.location or message.text == message.locale.default):
         answer = leonard.OutgoingMessage(
@@ -153,6 +155,7 @@ def explore_choose_location_callback(message, bot):
     bot.ask_question(answer, explore_choose_type_callback, 'location')
 
 
+@leonard.hooks.question_callback('explore_choose_type')
 def explore_choose_type_callback(message, bot):
     query = message.uncleaned_text
     if not query:
@@ -179,6 +182,7 @@ def explore_choose_type_callback(message, bot):
     send_place_detail(first_place, message, bot)
 
 
+@leonard.hooks.question_callback('more_places')
 def more_places_callback(message, bot):
     if message.text != message.locale.more:
         answer = leonard.OutgoingMessage(
@@ -4,53 +4,168 @@ description: saving user's notes
 priority: 250
 """
 
-import time
+import json
+import base64
+import threading
+
+import pymongo
+from pymongo.errors import BulkWriteError
+
 import leonard
 import leonard.utils
 
+# Number of notes in one page of "all notes"
+NOTES_PAGE_SIZE = 10
+
+# Names of databases, where indexes of notes are created
+indexed_databases = set()
+indexes_lock = threading.Lock()
+
+
+def get_notes_collection(user):
+    """
+    Get collection of notes and create its indexes on first use
+
+    :param user: User object
+    :return: Collection object
+    """
+    collection = user.database.db.notes
+    if user.database.db.name not in indexed_databases:
+        with indexes_lock:
+            # Notes are paged by datetime, id is used for equal datetimes
+            collection.create_index([('adapter_id', pymongo.ASCENDING),
+                                     ('datetime', pymongo.DESCENDING),
+                                     ('id', pymongo.DESCENDING)])
+            collection.create_index([('adapter_id', pymongo.ASCENDING),
+                                     ('id', pymongo.ASCENDING)], unique=True)
+            indexed_databases.add(user.database.db.name)
+    return collection
+
+
+def get_next_note_id(user):
+    """
+    Get id for new note of user from atomic counter
+
+    :param user: User object
+    :return: int
+    """
+    counter = user.database.db.counters.find_one_and_update(
+        {'_id': 'notes:{}'.format(user.adapter_id)},
+        {'$inc': {'value': 1}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    return counter['value']
+
+
+def migrate_notes(user):
+    """
+    Move notes from user's document to notes collection.
+    Before notes collection all notes were saved in user's document.
+
+    :param user: User object
+    :return:
+    """
+    if user.data.get('notes_migrated'):
+        return
+    notes = user.data.get('notes', [])
+    if notes:
+        try:
+            get_notes_collection(user).insert_many(
+                [{'adapter_id': user.adapter_id, 'id': note['id'],
+                  'datetime': note['datetime'], 'text': note['text']}
+                 for note in notes],
+                ordered=False
+            )
+        except BulkWriteError:
+            # Some notes were already moved by another process
+            pass
+        user.database.db.counters.update_one(
+            {'_id': 'notes:{}'.format(user.adapter_id)},
+            {'$max': {'value': max(note['id'] for note in notes)}},
+            upsert=True
+        )
+    user.data.pop('notes', None)
+    user.data.pop('all_notes_buffer', None)
+    user.data['notes_migrated'] = True
+    user.update()
+
 
 def add_note(user, note_text):
     if len(note_text) > 1000:
         note_text = note_text[:1000]
-    user.data['notes'] = user.data.get('notes', [])
-    if not user.data['notes']:
-        note_id = 1
-    else:
-        note_id = max(user.data['notes'], key=lambda x: x['id'])['id'] + 1
-    user.data['notes'].append({'id': note_id,
-                               'datetime': leonard.utils.utc(),
-                               'text': note_text})
-    user.update()
+    migrate_notes(user)
+    get_notes_collection(user).insert_one({
+        'adapter_id': user.adapter_id,
+        'id': get_next_note_id(user),
+        'datetime': leonard.utils.utc(),
+        'text': note_text
+    })
+
 
+def get_last_notes(user, num, cursor=None):
+    """
+    Get page of user's notes from the newest to the oldest
 
-def get_last_notes(user, num):
-    if not 'notes' in user.data:
-        return []
-    user_notes = sorted(user.data['notes'], key=lambda x: x['datetime'],
-                        reverse=True)
-    return user_notes[:num]
+    :param user: User object
+    :param num: int, number of notes in page, None for all notes
+    :param cursor: str, cursor of the last note of previous page
+                   or None for the first page
+    :return: list of notes and cursor for the next page
+             or None if there are no more notes
+    """
+    migrate_notes(user)
+    query = {'adapter_id': user.adapter_id}
+    if cursor is not None:
+        note_datetime, note_id = decode_cursor(cursor)
+        query['$or'] = [{'datetime': {'$lt': note_datetime}},
+                        {'datetime': note_datetime, 'id': {'$lt': note_id}}]
+    notes_cursor = get_notes_collection(user).find(query).sort([
+        ('datetime', pymongo.DESCENDING), ('id', pymongo.DESCENDING)
+    ])
+    # Notes were sliced by num before notes collection,
+    # but limit(0) returns all notes, so slicing is kept for such num
+    if num == 0:
+        return [], None
+    if num is None or num < 0:
+        return list(notes_cursor)[:num], None
+    notes = list(notes_cursor.limit(num))
+    # Page is not full, so there are no more notes
+    if len(notes) < num:
+        return notes, None
+    return notes, encode_cursor(notes[-1])
 
 
 def get_note_by_id(user, note_id):
-    for note in user.data['notes']:
-        if note_id == note['id']:
-            return note
+    migrate_notes(user)
+    return get_notes_collection(user).find_one({'adapter_id': user.adapter_id,
+                                                'id': note_id})
 
 
-def get_all_notes(user, ascending=False):
-    if not 'notes' in user.data:
-        return []
-    if ascending:
-        return sorted(user.data['notes'], key=lambda x: x['datetime'])
-    else:
-        return sorted(user.data['notes'], key=lambda x: x['datetime'],
-                      reverse=True)
+def encode_cursor(note):
+    """
+    Create opaque cursor of note for paging
+
+    :param note: dict, note from notes collection
+    :return: str
+    """
+    cursor = json.dumps([note['datetime'], note['id']])
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    """
+    Get datetime and id of note from cursor
+
+    :param cursor: str, cursor from encode_cursor
+    :return: datetime and id of note
+    """
+    return json.loads(base64.urlsafe_b64decode(cursor).decode('utf-8'))
 
 
 @leonard.hooks.ross(type='notes', subtype='add')
 def add_note_message(message, bot):
     query = message.variables['ross']['query']
-    message.sender.data['notes'] = message.sender.data.get('notes', [])
     if not query:
         answer = leonard.OutgoingMessage(
             recipient=message.sender,
@@ -66,6 +181,7 @@ def add_note_message(message, bot):
     bot.send_message(answer)
 
 
+@leonard.hooks.question_callback('add_note')
 def add_note_callback(message, bot):
     query = message.uncleaned_text
     if not query:
@@ -85,7 +201,8 @@ def add_note_callback(message, bot):
 
 @leonard.hooks.ross(type='notes', subtype='view', position='last')
 def last_notes_message(message, bot):
-    last_notes = get_last_notes(message.sender, message.variables['ross']['number'])
+    last_notes, cursor = get_last_notes(message.sender,
+                                        message.variables['ross']['number'])
     if len(last_notes) == 0:
         answer_text = message.locale.no_notes
     elif len(last_notes) == 1:
@@ -143,17 +260,9 @@ def notes_by_id_message(message, bot):
 
 @leonard.hooks.ross(type='notes', subtype='view', position='all')
 def all_notes_message(message, bot):
-    if message.sender.data.get('all_notes_buffer', []):
-        message.sender.data['all_notes_buffer'] = []
-    message.sender.data['all_notes_buffer'] = get_all_notes(message.sender,
-                                                            ascending=True)
-    show_notes = []
-    # Get last 10 notes
-    for i in range(10):
-        if message.sender.data['all_notes_buffer']:
-            show_notes.append(message.sender.data['all_notes_buffer'].pop())
-        else:
-            break
+    # Get last 10 notes, cursor of the last one is saved for "more"
+    show_notes, cursor = get_last_notes(message.sender, NOTES_PAGE_SIZE)
+    message.sender.data['notes_cursor'] = cursor
     message.sender.update()
     if not show_notes:
         answer = leonard.OutgoingMessage(
@@ -181,6 +290,7 @@ def all_notes_message(message, bot):
     bot.ask_question(answer, all_notes_callback, 'notes')
 
 
+@leonard.hooks.question_callback('all_notes')
 def all_notes_callback(message, bot):
     # If message is not 'more', so ignore it
     if message.text != message.locale.more.lower():
@@ -190,19 +300,19 @@ def all_notes_callback(message, bot):
         )
         bot.ask_question(answer, all_notes_callback, 'notes')
         return
-    if not message.sender.data['all_notes_buffer']:
+    show_notes = []
+    cursor = message.sender.data.get('notes_cursor')
+    if cursor:
+        show_notes, cursor = get_last_notes(message.sender, NOTES_PAGE_SIZE,
+                                            cursor)
+    if not show_notes:
         answer = leonard.OutgoingMessage(
             recipient=message.sender,
             text=message.locale.no_more_notes
         )
         bot.send_message(answer)
         return
-    show_notes = []
-    for i in range(10):
-        if message.sender.data['all_notes_buffer']:
-            show_notes.append(message.sender.data['all_notes_buffer'].pop())
-        else:
-            break
+    message.sender.data['notes_cursor'] = cursor
     message.sender.update()
     answer_text = ''
     for note in show_notes:
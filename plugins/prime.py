@@ -78,7 +78,7 @@ def is_prime_message(message, bot):
 @leonard.hooks.keywords([['primes'], ['простые']])
 def primes_list_message(message, bot):
     # Find all digits in message, may be its limit of primes
-    numbers = leonard.utils.find_numbers(message.normalizated_text)
+    numbers = message.get_numbers(normalize=True)
     # If user didn't define limits, print all prime numbers from 1 to 1000
     if not numbers:
         a = 1
@@ -126,7 +126,7 @@ def primes_list_message(message, bot):
 @leonard.hooks.start_end(['factor', 'factorize', 'prime factors', 'разложи',
                           'множители', 'простые множители', 'факторизуй'])
 def factorize_message(message, bot):
-    numbers = leonard.utils.find_numbers(message.normalizated_text)
+    numbers = message.get_numbers(normalize=True)
     if not numbers:
         answer = leonard.OutgoingMessage(
             recipient=message.sender,
@@ -47,6 +47,7 @@ def registration(message, bot):
     bot.ask_question(question, language_callback, 'registration')
 
 
+@leonard.hooks.question_callback('language')
 def language_callback(message, bot):
     """
     Function calling when user choosing language
@@ -83,6 +84,7 @@ def language_callback(message, bot):
     bot.ask_question(answer, location_callback, 'registration')
 
 
+@leonard.hooks.question_callback('location')
 def location_callback(message, bot):
     if not message.location:
         answer = leonard.OutgoingMessage(
@@ -4,6 +4,8 @@ description: save reminders and notificate about it
 priority: 300
 """
 
+import json
+
 import schedule
 import leonard
 from leonard.utils import utc
@@ -14,14 +16,19 @@ time_variants = [
 ]
 
 
+# Reminders are saved in storage's schedule with that name
+REMINDERS_KEY = 'reminders'
+
+# Reminders were saved in one JSON list before schedule,
+# they are moved to schedule once by the first tick
+legacy_reminders_moved = False
+
+
 def create_notification(bot, message, ross_data, reminder_time):
-    bot.storage.set_json('reminders',
-                         bot.storage.get_json('reminders', []) +
-                             [[message.sender.data['adapter_id'],
-                              reminder_time,
-                              message.locale.reminder.format(ross_data['query'])]
-                             ]
-                        )
+    bot.storage.add_scheduled(REMINDERS_KEY, {
+        'adapter_id': message.sender.adapter_id,
+        'text': message.locale.reminder.format(ross_data['query'])
+    }, reminder_time)
     answer = leonard.OutgoingMessage(
         recipient=message.sender,
         text=message.locale.created
@@ -29,6 +36,30 @@ def create_notification(bot, message, ross_data, reminder_time):
     bot.send_message(answer)
 
 
+def move_legacy_reminders(bot):
+    """
+    Move reminders from old JSON list to schedule
+
+    :param bot: Leonard object
+    :return:
+    """
+    global legacy_reminders_moved
+    if legacy_reminders_moved or not bot.storage.redis:
+        return
+    pipeline = bot.storage.redis.pipeline()
+    pipeline.get(REMINDERS_KEY)
+    pipeline.delete(REMINDERS_KEY)
+    reminders = pipeline.execute()[0]
+    if reminders:
+        for (adapter_id, reminder_time, text) in json.loads(
+                reminders.decode('utf-8')):
+            bot.storage.add_scheduled(REMINDERS_KEY, {
+                'adapter_id': adapter_id,
+                'text': text
+            }, reminder_time)
+    legacy_reminders_moved = True
+
+
 @leonard.hooks.ross(type='reminders', subtype='create')
 def create_reminder_message(message, bot):
     ross_data = message.variables['ross']
@@ -50,21 +81,14 @@ def create_reminder_message(message, bot):
 
 @leonard.hooks.interval(schedule.every(5).seconds)
 def reminders_tick(bot):
-    reminders = bot.storage.get_json('reminders')
-    if not reminders:
-        return
-    i = 0
-    while i < len(reminders):
-        if utc() >= reminders[i][1]:
-            recipient = bot.database.find_by_adapter_id(reminders[i][0])
-            answer = leonard.OutgoingMessage(
-                recipient=recipient,
-                text=reminders[i][2]
-            )
-            bot.send_message(answer)
-            reminders.pop(i)
-        i += 1
-    reminders = bot.storage.set_json('reminders', reminders)
+    move_legacy_reminders(bot)
+    for reminder in bot.storage.pop_scheduled(REMINDERS_KEY, utc()):
+        recipient = bot.database.find_by_adapter_id(reminder['adapter_id'])
+        answer = leonard.OutgoingMessage(
+            recipient=recipient,
+            text=reminder['text']
+        )
+        bot.send_message(answer)
 
 
 class EnglishLocale(leonard.locale.EnglishLocale):
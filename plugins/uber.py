@@ -20,6 +20,7 @@ def get_taxi_message(message, bot):
     bot.ask_question(answer, current_location_callback, 'uber')
 
 
+@leonard.hooks.question_callback('current_location')
 def current_location_callback(message, bot):
     if not message.location:
         get_taxi_message(message, bot)
@@ -32,6 +33,7 @@ def current_location_callback(message, bot):
     bot.ask_question(answer, choose_destination_callback, 'uber')
 
 
+@leonard.hooks.question_callback('choose_destination')
 def choose_destination_callback(message, bot):
     if not message.location:
         get_taxi_message(message, bot)
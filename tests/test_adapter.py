@@ -14,3 +14,38 @@ def test_loading_adapter():
     assert hasattr(result, 'name')
     assert hasattr(result, 'module')
     assert hasattr(result, 'config')
+
+
+def test_message_views():
+    message = adapter.IncomingMessage(
+        'test', text='Hey, Leonard! Primes between 5 and 20', variables={}
+    )
+    assert message.text == 'hey leonard primes between 5 and 20'
+    assert message.get_words() == ['hey', 'leonard', 'primes', 'between',
+                                   '5', 'and', '20']
+    assert 'leonard' in message.get_word_set()
+    assert 'leonard' not in message.get_word_set(normalize=True)
+    assert message.get_numbers(normalize=True) == [5, 20]
+    assert 'and 20' in message.get_ngrams(2)
+    # Views are computed once and shared
+    assert message.get_words() is message.get_words()
+
+
+def test_message_normalizated_text_is_lazy():
+    message = adapter.IncomingMessage('test', text='Hey, who is Taylor Swift',
+                                      variables={})
+    assert ('text', True) not in message._views
+    assert message.normalizated_text == 'whotaylor swift'
+    message.normalizated_text = 'taylor swift'
+    assert message.get_words(normalize=True) == ['taylor', 'swift']
+
+
+def test_messages_dont_share_containers():
+    first = adapter.IncomingMessage('test', text='gif cats')
+    second = adapter.IncomingMessage('test', text='gif dogs')
+    first.variables['query'] = 'cats'
+    assert second.variables == {}
+    assert first.attachments is not second.attachments
+    answer = adapter.OutgoingMessage(None, text='Hi')
+    assert answer.buttons == []
+    assert not hasattr(first, '__dict__')
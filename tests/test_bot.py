@@ -0,0 +1,98 @@
+import time
+import pickle
+
+from leonard import hooks, Leonard
+from leonard.adapter import IncomingMessage, OutgoingMessage
+from leonard.router import HookRouter
+from leonard.utils import NextHook
+from plugins import notes
+
+# Create bot
+bot = Leonard({'config-prefix': 'LEONARD_',
+               'adapter': 'console'})
+
+
+def create_message(adapter_id, text):
+    return IncomingMessage(adapter_id, text=text,
+                           variables={'last_message': {'text': text}})
+
+
+def test_question_without_redis():
+    answers = []
+
+    @hooks.question_callback('answer')
+    def answer_callback(message, bot):
+        answers.append((message.text, message.variables['question_payload']))
+
+    bot.plugins_manager.question_callbacks['test.answer'] = answer_callback
+    adapter_id = 'test_question_without_redis'
+    redis = bot.storage.redis
+    bot.storage.redis = None
+    try:
+        user = bot.database.find_by_adapter_id(adapter_id)
+        bot.ask_question(OutgoingMessage(recipient=user, text='Question?'),
+                         answer_callback, 'test', {'step': 1})
+        bot.parse_message(create_message(adapter_id, 'answer'))
+        assert answers == [('answer', {'step': 1})]
+        # Question is answered only once
+        bot.parse_message(create_message(adapter_id, 'answer'))
+        assert len(answers) == 1
+    finally:
+        bot.storage.redis = redis
+
+
+class FakeConfig:
+    priority = 10
+
+
+class FakePlugin:
+    name = 'plugins.test'
+    config = FakeConfig()
+    localization = None
+
+    def __init__(self, hooks):
+        self.hooks = hooks
+        for hook in hooks:
+            hook.plugin = self
+
+
+def test_next_hook_after_rejection():
+    calls = []
+
+    def rejecting_hook(message, bot):
+        calls.append('rejecting')
+        raise NextHook
+
+    def accepting_hook(message, bot):
+        calls.append('accepting')
+
+    first_hook = hooks.CallbackHook(rejecting_hook, lambda m, b: True)
+    first_hook.priority = 2
+    second_hook = hooks.CallbackHook(accepting_hook, lambda m, b: True)
+    router = bot.plugins_manager.router
+    bot.plugins_manager.router = HookRouter([FakePlugin([first_hook,
+                                                         second_hook])])
+    try:
+        bot.parse_message(create_message('test_next_hook', 'anything'))
+    finally:
+        bot.plugins_manager.router = router
+    assert calls == ['rejecting', 'accepting']
+
+
+def test_answering_pickled_question():
+    # Questions were saved in user's document with pickled callbacks
+    adapter_id = str(time.time())
+    bot.database.create_new_user(adapter_id)
+    bot.database.collection.update_one({'adapter_id': adapter_id}, {'$set': {
+        'language': 'en',
+        'question': pickle.dumps(notes.add_note_callback),
+        'question_plugin': 'notes'
+    }})
+    bot.database.invalidate_user(adapter_id)
+    bot.parse_message(create_message(adapter_id, 'Buy milk'))
+    document = bot.database.collection.find_one({'adapter_id': adapter_id})
+    assert 'question' not in document
+    assert 'question_plugin' not in document
+    user = bot.database.find_by_adapter_id(adapter_id)
+    last_notes, cursor = notes.get_last_notes(user, 1)
+    assert last_notes[0]['text'] == 'Buy milk'
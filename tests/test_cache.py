@@ -0,0 +1,37 @@
+import time
+
+from leonard.utils.cache import LRUCache
+
+
+def test_cache_get_and_set():
+    cache = LRUCache(max_size=10)
+    assert cache.get('last note') is None
+    cache.set('last note', {'type': 'notes'})
+    assert cache.get('last note') == {'type': 'notes'}
+    assert cache.get('weather', 'default') == 'default'
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # 'a' is used, so 'b' is the least recently used now
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_cache_ttl():
+    cache = LRUCache(max_size=2, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
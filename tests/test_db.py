@@ -36,3 +36,126 @@ def test_updating_user():
     result.update()
     result = database.find_by_adapter_id(adapter_id)
     assert result.data['test_property'] == 'Hello, world'
+
+
+def test_creating_existing_user():
+    adapter_id = time.time()
+    first = database.create_new_user(adapter_id)
+    second = database.create_new_user(adapter_id)
+    assert first.data['_id'] == second.data['_id']
+    assert len(database.find({'adapter_id': adapter_id})) == 1
+
+
+def test_user_data_changes():
+    data = db.UserData({'_id': 1, 'language': 'en', 'notes': [],
+                        'question': 'pickled'})
+    assert data.get_changes() == ({}, {})
+    data['language'] = 'ru'
+    data['notes'].append({'id': 1})
+    del data['question']
+    assert data.get_changes() == ({'language': 'ru', 'notes': [{'id': 1}]},
+                                  {'question': ''})
+    data.save_changes()
+    assert data.get_changes() == ({}, {})
+
+
+def test_updating_changed_fields():
+    adapter_id = time.time()
+    user = database.find_by_adapter_id(adapter_id)
+    user.data['notes'] = [{'id': 1}]
+    user.update()
+    user.data['notes'].append({'id': 2})
+    user.update()
+    result = database.find_by_adapter_id(adapter_id)
+    assert result.data['notes'] == [{'id': 1}, {'id': 2}]
+
+
+def test_unit_of_work():
+    adapter_id = time.time()
+    user = database.find_by_adapter_id(adapter_id)
+    unit_of_work = db.UnitOfWork(database)
+    unit_of_work.add(user)
+    user.data['language'] = 'en'
+    user.update()
+    user.data['question'] = ''
+    user.update()
+    # Changes are not saved before flush
+    assert 'language' not in database.find_by_adapter_id(adapter_id).data
+    unit_of_work.close()
+    result = database.find_by_adapter_id(adapter_id)
+    assert result.data['language'] == 'en'
+    assert result.data['question'] == ''
+    assert user.unit_of_work is None
+
+
+def test_users_cache():
+    adapter_id = time.time()
+    user = database.find_by_adapter_id(adapter_id)
+    hits = database.users_cache.hits
+    user.data['language'] = 'en'
+    user.update()
+    # Cache is updated after saving
+    result = database.find_by_adapter_id(adapter_id)
+    assert database.users_cache.hits == hits + 1
+    assert result.data['language'] == 'en'
+    # Cached document isn't changed by changing of User object
+    result.data['language'] = 'ru'
+    assert database.find_by_adapter_id(adapter_id).data['language'] == 'en'
+    database.invalidate_user(adapter_id)
+    assert database.users_cache.get(adapter_id) is None
+
+
+def test_lazy_heavy_fields():
+    adapter_id = time.time()
+    user = database.find_by_adapter_id(adapter_id)
+    user.data['language'] = 'en'
+    user.data['notes'] = [{'id': 1}]
+    user.update()
+    database.invalidate_user(adapter_id)
+
+    result = database.find_by_adapter_id(adapter_id)
+    assert result.data.get_loaded().get('language') == 'en'
+    assert 'notes' not in result.data.get_loaded()
+    # Notes are loaded on first access
+    assert result.data['notes'] == [{'id': 1}]
+    assert 'recommended_places' not in result.data
+    assert result.get_changes() is None
+
+
+def test_saving_with_versions():
+    adapter_id = time.time()
+    user = database.find_by_adapter_id(adapter_id)
+    user.data['language'] = 'en'
+    user.update()
+    assert user.data['version'] == 1
+
+    # Two processes read the same version of user
+    database.invalidate_user(adapter_id)
+    first = database.find_by_adapter_id(adapter_id)
+    database.invalidate_user(adapter_id)
+    second = database.find_by_adapter_id(adapter_id)
+    first.data['location'] = [55.75, 37.61]
+    first.update()
+    # Second saving conflicts, so its changes are merged
+    second.data['question'] = ''
+    second.update()
+    assert second.data['location'] == [55.75, 37.61]
+
+    database.invalidate_user(adapter_id)
+    result = database.find_by_adapter_id(adapter_id)
+    assert result.data['language'] == 'en'
+    assert result.data['location'] == [55.75, 37.61]
+    assert result.data['question'] == ''
+    assert result.data['version'] == 3
+
+
+def test_saving_user_without_version():
+    adapter_id = time.time()
+    database.collection.insert_one({'adapter_id': adapter_id})
+    user = database.find_by_adapter_id(adapter_id)
+    user.data['language'] = 'en'
+    user.update()
+    database.invalidate_user(adapter_id)
+    result = database.find_by_adapter_id(adapter_id)
+    assert result.data['language'] == 'en'
+    assert result.data['version'] == 1
@@ -0,0 +1,32 @@
+from leonard import leader, Leonard
+
+# Create bot
+bot = Leonard({'config-prefix': 'LEONARD_',
+               'adapter': 'console'})
+
+
+def test_one_leader():
+    key = 'test_leader'
+    bot.storage.redis.delete(key)
+    first = leader.LeaderElection(bot.storage, key=key, lease_time=5)
+    second = leader.LeaderElection(bot.storage, key=key, lease_time=5)
+    assert first.hold()
+    assert not second.hold()
+    # Leader extends its lease
+    assert first.hold()
+    assert first.is_leader()
+    assert not second.is_leader()
+
+
+def test_releasing_lease():
+    key = 'test_leader_release'
+    bot.storage.redis.delete(key)
+    first = leader.LeaderElection(bot.storage, key=key, lease_time=5)
+    second = leader.LeaderElection(bot.storage, key=key, lease_time=5)
+    assert first.hold()
+    # Only owner can release lease
+    bot.storage.release_lease(key, second.owner)
+    assert not second.hold()
+    bot.storage.release_lease(key, first.owner)
+    assert second.hold()
+    assert not first.hold()
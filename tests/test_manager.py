@@ -29,3 +29,11 @@ def test_importing_correct_plugin():
 def test_importing_incorrect_plugin():
     plugin  = manager.import_plugin('plugins.hellossssssss')
     assert plugin is None
+
+
+def test_question_callbacks():
+    from plugins import notes
+    plugins_manager.build_question_callbacks()
+    callback = plugins_manager.get_question_callback('notes', 'add_note')
+    assert callback == notes.add_note_callback
+    assert plugins_manager.get_question_callback('notes', 'nothing') is None
@@ -0,0 +1,216 @@
+from leonard import hooks, matchers
+from leonard.adapter import IncomingMessage
+
+
+def create_message_hooks(regexes_list):
+    return [hooks.MessageHook(None, regexes) for regexes in regexes_list]
+
+
+def find_first(matcher, text):
+    message = IncomingMessage('test', text=text, variables={})
+    return next(matcher.find(message, None), (None, None))
+
+
+def test_regex_matcher_finds_first_hook():
+    message_hooks = create_message_hooks([
+        [r'prime (\d+)', r'(\d+) in primes'],
+        [r'(\w+) (\d+)'],
+        ['cat|dog']
+    ])
+    matcher = matchers.RegexMatcher(message_hooks)
+
+    hook, variables = find_first(matcher, '5 in primes')
+    assert hook == message_hooks[0]
+    assert variables['regex_match'] == ('5', )
+
+    hook, variables = find_first(matcher, 'factor 12')
+    assert hook == message_hooks[1]
+    assert variables['regex_match'] == ('factor', '12')
+
+    hook, variables = find_first(matcher, 'dog')
+    assert hook == message_hooks[2]
+    assert variables['regex_match'] == ()
+
+    hook, variables = find_first(matcher, 'nothing here')
+    assert hook is None
+
+
+def test_regex_matcher_finds_hooks_after_first():
+    message_hooks = create_message_hooks([[r'prime (\d+)'], ['nothing'],
+                                          [r'(\w+) 7']])
+    matcher = matchers.RegexMatcher(message_hooks)
+    message = IncomingMessage('test', text='prime 7', variables={})
+    found = list(matcher.find(message, None))
+    assert found == [(message_hooks[0], {'regex_match': ('7', )}),
+                     (message_hooks[2], {'regex_match': ('prime', )})]
+
+
+def test_regex_matcher_with_backreferences():
+    message_hooks = create_message_hooks([[r'(\w+) and \1'], [r'(\w+) and']])
+    matcher = matchers.RegexMatcher(message_hooks)
+    message = IncomingMessage('test', text='cats and cats', variables={})
+    hook, variables = next(matcher.find(message, None))
+    assert hook == message_hooks[0]
+    assert message.variables['regex_match'] == ('cats', )
+
+
+def test_uncapturing_groups():
+    assert matchers.uncapture(r'prime (\d+)') == r'prime (?:\d+)'
+    assert matchers.uncapture(r'\((\w+)\)') == r'\((?:\w+)\)'
+    assert matchers.uncapture(r'[(](a)') == r'[(](?:a)'
+    assert matchers.uncapture(r'(?:a)(b)') == r'(?:a)(?:b)'
+
+
+def test_keywords_matcher():
+    keywords_hooks = [
+        hooks.KeywordsHook(None, [['weather', 'tomorrow'], ['forecast']]),
+        hooks.KeywordsHook(None, [['weather']]),
+        hooks.KeywordsHook(None, [['Tomorrow']], normalize=False)
+    ]
+    matcher = matchers.KeywordsMatcher(keywords_hooks)
+
+    hook, variables = find_first(matcher, 'tomorrow weather')
+    assert hook == keywords_hooks[0]
+
+    message = IncomingMessage('test', text='weather now', variables={})
+    assert [hook for (hook, variables) in matcher.find(message, None)] == [
+        keywords_hooks[1]
+    ]
+
+    message = IncomingMessage('test', text='tomorrow', variables={})
+    assert [hook for (hook, variables) in matcher.find(message, None)] == [
+        keywords_hooks[2]
+    ]
+
+    hook, variables = find_first(matcher, 'nothing here')
+    assert hook is None
+
+
+def test_start_end_matcher():
+    start_end_hooks = [
+        hooks.StartEndHook(None, ['prime factors', 'factor']),
+        hooks.StartEndHook(None, ['gif', 'гифка'])
+    ]
+    matcher = matchers.StartEndMatcher(start_end_hooks)
+
+    hook, variables = find_first(matcher, 'prime factors 12')
+    assert hook == start_end_hooks[0]
+    assert variables['query'] == '12'
+
+    hook, variables = find_first(matcher, 'funny cats gif')
+    assert hook == start_end_hooks[1]
+    assert variables['query'] == 'funny cats'
+
+    hook, variables = find_first(matcher, 'гифка')
+    assert hook == start_end_hooks[1]
+    assert variables['query'] == ''
+
+    # Starts and ends are whole words
+    hook, variables = find_first(matcher, 'giffy cats')
+    assert hook is None
+
+
+def test_command_matcher():
+    command_hooks = [hooks.CommandHook(None, 'hello'),
+                     hooks.CommandHook(None, 'hell')]
+    matcher = matchers.CommandMatcher(command_hooks)
+
+    hook, variables = find_first(matcher, '!hello')
+    assert hook == command_hooks[0]
+
+    hook, variables = find_first(matcher, '  !Hell, yeah')
+    assert hook is None
+
+    hook, variables = find_first(matcher, '!hell yeah')
+    assert hook == command_hooks[1]
+
+    hook, variables = find_first(matcher, 'hello')
+    assert hook is None
+
+
+def test_ross_matcher():
+    ross_hooks = [hooks.RossHook(None, {'type': 'notes', 'subtype': 'add'}),
+                  hooks.RossHook(None, {'type': 'notes'}),
+                  hooks.RossHook(None, {'type': 'weather'})]
+    matcher = matchers.RossMatcher(ross_hooks)
+
+    # Ross result is already saved in message, so it's not parsed again
+    message = IncomingMessage('test', text='note buy milk', variables={})
+    message.ross_params = {'type': 'notes', 'subtype': 'add'}
+    assert [hook for (hook, variables) in matcher.find(message, None)] == [
+        ross_hooks[0], ross_hooks[1]
+    ]
+
+    message = IncomingMessage('test', text='last note', variables={})
+    message.ross_params = {'type': 'notes', 'subtype': 'view'}
+    hook, variables = next(matcher.find(message, None))
+    assert hook == ross_hooks[1]
+    assert variables['ross'] == message.ross_params
+
+    message = IncomingMessage('test', text='nothing', variables={})
+    message.ross_params = {}
+    assert list(matcher.find(message, None)) == []
+
+
+def test_regex_matcher_merges_groups():
+    message_hooks = [
+        hooks.MessageHook(None, [r'cats? (\w+)'], case_sensitive=True),
+        hooks.MessageHook(None, [r'cat (\w+)']),
+        hooks.MessageHook(None, [r'(\w+) dog'], case_sensitive=True),
+        hooks.MessageHook(None, [r'(\w+) and \1'])
+    ]
+    matcher = matchers.RegexMatcher(message_hooks)
+    message = IncomingMessage('test', text='cat and cat dog', variables={})
+    found = [hook for (hook, variables) in matcher.find(message, None)]
+    assert found == [message_hooks[0], message_hooks[1], message_hooks[3]]
+
+
+class FakeRossResult:
+    def __init__(self, **params):
+        self.__dict__.update(params)
+
+
+def count_ross_calls(monkeypatch):
+    texts = []
+
+    def process_message(text):
+        texts.append(text)
+        return FakeRossResult(type='notes', subtype='view')
+
+    monkeypatch.setattr(hooks.ross_module, 'process_message', process_message)
+    return texts
+
+
+def test_parsing_ross_once(monkeypatch):
+    texts = count_ross_calls(monkeypatch)
+    ross_hooks = [hooks.RossHook(None, {'type': 'weather'}),
+                  hooks.RossHook(None, {'type': 'notes', 'subtype': 'add'}),
+                  hooks.RossHook(None, {'type': 'notes'})]
+    matcher = matchers.RossMatcher(ross_hooks)
+    text = 'ross parses it once'
+    hooks.ross_cache.delete(text)
+    message = IncomingMessage('test', text=text, variables={})
+    assert [hook for (hook, variables) in matcher.find(message, None)] == [
+        ross_hooks[2]
+    ]
+    # Hooks checked one by one use the same result
+    assert [hook.check(message, None) for hook in ross_hooks] == [
+        False, False, True
+    ]
+    assert texts == [text]
+
+
+def test_caching_ross_results(monkeypatch):
+    texts = count_ross_calls(monkeypatch)
+    ross_hook = hooks.RossHook(None, {'type': 'notes'})
+    text = 'ross caches it'
+    hooks.ross_cache.delete(text)
+    first_message = IncomingMessage('test', text=text, variables={})
+    assert ross_hook.check(first_message, None)
+    hits = hooks.ross_cache.hits
+    second_message = IncomingMessage('test', text=text, variables={})
+    assert ross_hook.check(second_message, None)
+    assert texts == [text]
+    assert hooks.ross_cache.hits == hits + 1
+    # Every message gets its own copy of result
+    assert second_message.ross_params is not first_message.ross_params
@@ -0,0 +1,66 @@
+import time
+
+from leonard import db, Leonard
+from plugins import notes
+
+# Create bot
+bot = Leonard({'config-prefix': 'LEONARD_',
+               'adapter': 'console'})
+# Connect to database
+database = db.Database(bot, 'LEONARD_')
+
+
+def create_legacy_user(legacy_notes):
+    # time.time() - test adapter_id
+    adapter_id = str(time.time())
+    database.create_new_user(adapter_id)
+    database.collection.update_one({'adapter_id': adapter_id}, {'$set': {
+        'notes': legacy_notes,
+        'all_notes_buffer': legacy_notes[:1]
+    }})
+    database.invalidate_user(adapter_id)
+    return database.find_by_adapter_id(adapter_id)
+
+
+def create_notes(count):
+    # Every three notes have the same datetime
+    return [{'id': i, 'datetime': 100.0 + i // 3, 'text': 'note {}'.format(i)}
+            for i in range(1, count + 1)]
+
+
+def test_migrating_notes():
+    user = create_legacy_user(create_notes(3))
+    last_notes, cursor = notes.get_last_notes(user, 10)
+    assert [note['id'] for note in last_notes] == [3, 2, 1]
+    document = database.collection.find_one({'adapter_id': user.adapter_id})
+    assert 'notes' not in document
+    assert 'all_notes_buffer' not in document
+    assert document['notes_migrated']
+    # Counter of ids continues from migrated notes
+    notes.add_note(user, 'new note')
+    assert notes.get_note_by_id(user, 4)['text'] == 'new note'
+
+
+def test_paging_notes():
+    user = create_legacy_user(create_notes(25))
+    pages = []
+    page, cursor = notes.get_last_notes(user, 5)
+    pages.append(page)
+    while cursor is not None:
+        page, cursor = notes.get_last_notes(user, 5, cursor)
+        pages.append(page)
+    # The last full page ends exactly at the last note,
+    # so the next page is empty
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 5, 0]
+    ids = [note['id'] for page in pages for note in page]
+    assert ids == list(range(25, 0, -1))
+
+
+def test_number_of_last_notes():
+    user = create_legacy_user(create_notes(4))
+    assert notes.get_last_notes(user, 0) == ([], None)
+    all_notes, cursor = notes.get_last_notes(user, None)
+    assert [note['id'] for note in all_notes] == [4, 3, 2, 1]
+    assert cursor is None
+    last_notes, cursor = notes.get_last_notes(user, -1)
+    assert [note['id'] for note in last_notes] == [4, 3, 2]
@@ -0,0 +1,89 @@
+from leonard import router, hooks
+from leonard.adapter import IncomingMessage
+
+
+class FakeConfig:
+    def __init__(self, priority):
+        self.priority = priority
+
+
+class FakePlugin:
+    def __init__(self, priority, hooks):
+        self.config = FakeConfig(priority)
+        self.hooks = hooks
+        for hook in hooks:
+            hook.plugin = self
+
+
+class FakeHook:
+    type = 'callback'
+
+    def __init__(self, priority, matched):
+        self.priority = priority
+        self.matched = matched
+        self.checked = 0
+
+    def check(self, message, bot):
+        self.checked += 1
+        return self.matched
+
+
+def test_routing_by_priority():
+    low_hook = FakeHook(5, True)
+    high_hook = FakeHook(1, True)
+    hook_router = router.HookRouter([FakePlugin(10, [low_hook]),
+                                     FakePlugin(100, [high_hook])])
+    assert next(hook_router.route(None, None)) == high_hook
+
+
+def test_routing_stops_on_first_match():
+    first_hook = FakeHook(3, True)
+    second_hook = FakeHook(2, True)
+    third_hook = FakeHook(1, False)
+    hook_router = router.HookRouter([
+        FakePlugin(10, [first_hook, second_hook, third_hook])
+    ])
+    routed_hooks = hook_router.route(None, None)
+    assert next(routed_hooks) == first_hook
+    routed_hooks.close()
+    assert second_hook.checked == 0
+    assert third_hook.checked == 0
+    assert hook_router.stats.messages == 1
+    assert hook_router.stats.last_hooks_evaluated == 1
+
+
+def test_routing_to_next_hook():
+    first_hook = FakeHook(3, True)
+    second_hook = FakeHook(2, False)
+    third_hook = FakeHook(1, True)
+    hook_router = router.HookRouter([
+        FakePlugin(10, [first_hook, second_hook, third_hook])
+    ])
+    result = list(hook_router.route(None, None))
+    assert result == [first_hook, third_hook]
+    assert hook_router.stats.hooks_evaluated == 3
+
+
+def test_routing_with_matchers():
+    message_hook = hooks.MessageHook(None, [r'prime (\d+)'])
+    high_hook = FakeHook(10, False)
+    low_hook = FakeHook(0, True)
+    hook_router = router.HookRouter([FakePlugin(10, [high_hook, message_hook,
+                                                     low_hook])])
+    message = IncomingMessage('test', text='prime 7', variables={})
+    routed_hooks = hook_router.route(message, None)
+    assert next(routed_hooks) == message_hook
+    assert message.variables['regex_match'] == ('7', )
+    assert high_hook.checked == 1
+    assert low_hook.checked == 0
+    assert next(routed_hooks) == low_hook
+
+
+def test_routing_commands_first():
+    command_hook = hooks.CommandHook(None, 'hello')
+    high_hook = FakeHook(10, True)
+    hook_router = router.HookRouter([FakePlugin(100, [high_hook]),
+                                     FakePlugin(1, [command_hook])])
+    message = IncomingMessage('test', text='!hello', variables={})
+    assert next(hook_router.route(message, None)) == command_hook
+    assert high_hook.checked == 0
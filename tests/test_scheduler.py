@@ -0,0 +1,80 @@
+import time
+import threading
+
+import schedule
+
+from leonard import hooks, scheduler, workers
+
+
+def run_scheduler(hooks_list, seconds):
+    pool = workers.WorkerPool(workers=2, queue_size=10)
+    pool.start()
+    interval_scheduler = scheduler.IntervalScheduler(None, pool)
+    for hook in hooks_list:
+        interval_scheduler.add(hook)
+    thread = threading.Thread(target=interval_scheduler.run)
+    thread.start()
+    time.sleep(seconds)
+    interval_scheduler.stop()
+    thread.join()
+    return interval_scheduler, pool
+
+
+def test_running_hooks_by_interval():
+    calls = {'fast': 0, 'slow': 0}
+
+    def fast(bot):
+        calls['fast'] += 1
+
+    def slow(bot):
+        calls['slow'] += 1
+
+    interval_scheduler, pool = run_scheduler([
+        hooks.IntervalHook(fast, schedule.every(0.05).seconds),
+        hooks.IntervalHook(slow, schedule.every(10).seconds)
+    ], 0.3)
+    pool.stop()
+    assert 3 <= calls['fast'] <= 6
+    assert calls['slow'] == 0
+    assert interval_scheduler.stats()['fast']['runs'] == calls['fast']
+
+
+def test_skipping_overlapping_runs():
+    event = threading.Event()
+    calls = []
+
+    def long_hook(bot):
+        calls.append(1)
+        event.wait()
+
+    interval_scheduler, pool = run_scheduler([
+        hooks.IntervalHook(long_hook, schedule.every(0.02).seconds)
+    ], 0.2)
+    event.set()
+    pool.stop()
+    stats = interval_scheduler.stats()['long_hook']
+    assert calls == [1]
+    assert stats['runs'] == 1
+    assert stats['skipped'] > 0
+
+
+class FakeLeader:
+    def is_leader(self):
+        return False
+
+
+def test_running_hooks_only_in_leader():
+    calls = []
+    pool = workers.WorkerPool(workers=1, queue_size=10)
+    pool.start()
+    interval_scheduler = scheduler.IntervalScheduler(None, pool, FakeLeader())
+    interval_scheduler.add(hooks.IntervalHook(calls.append,
+                                              schedule.every(0.02).seconds))
+    thread = threading.Thread(target=interval_scheduler.run)
+    thread.start()
+    time.sleep(0.1)
+    interval_scheduler.stop()
+    thread.join()
+    pool.stop()
+    assert calls == []
+    assert interval_scheduler.stats()['append']['not_leader'] > 0
@@ -25,3 +25,56 @@ def test_default_value():
     # Custom default value
     result = bot.storage.get('test_non_existing_key', 0)
     assert result == 0
+
+
+def test_last_messages_ring():
+    adapter_id = 'test_ring'
+    bot.storage.redis.delete('last_messages:{}'.format(adapter_id))
+    for i in range(bot.storage.last_messages_count + 5):
+        bot.storage.save_last_message(adapter_id, {'message_id': i})
+    last_messages = bot.storage.get_last_messages(adapter_id)
+    assert len(last_messages) == bot.storage.last_messages_count
+    newest_id = bot.storage.last_messages_count + 4
+    assert last_messages[0] == {'message_id': newest_id}
+
+
+def test_question_expires():
+    adapter_id = 'test_question'
+    bot.storage.save_question(adapter_id, 'add_note', 'notes', {'page': 2})
+    key = 'question:{}'.format(adapter_id)
+    assert 0 < bot.storage.redis.ttl(key) <= bot.storage.question_ttl
+    assert bot.storage.pop_question(adapter_id) == {'callback': b'add_note',
+                                                    'plugin': 'notes',
+                                                    'payload': {'page': 2}}
+    # Question is answered only once
+    assert bot.storage.pop_question(adapter_id) is None
+
+
+def test_scheduled_values():
+    key = 'test_schedule'
+    bot.storage.redis.delete('{}:schedule'.format(key),
+                             '{}:items'.format(key))
+    bot.storage.add_scheduled(key, {'text': 'later'}, 200)
+    bot.storage.add_scheduled(key, {'text': 'second'}, 20)
+    bot.storage.add_scheduled(key, {'text': 'first'}, 10)
+    assert bot.storage.pop_scheduled(key, 100) == [{'text': 'first'},
+                                                   {'text': 'second'}]
+    # Values are returned only once
+    assert bot.storage.pop_scheduled(key, 100) == []
+    assert bot.storage.pop_scheduled(key, 300) == [{'text': 'later'}]
+    # Values are deleted from hash with schedule
+    assert not bot.storage.redis.exists('{}:items'.format(key))
+
+
+def test_scheduled_values_count():
+    key = 'test_schedule_count'
+    bot.storage.redis.delete('{}:schedule'.format(key),
+                             '{}:items'.format(key))
+    for i in range(5):
+        bot.storage.add_scheduled(key, {'number': i}, i)
+    assert bot.storage.pop_scheduled(key, 100, count=3) == [
+        {'number': 0}, {'number': 1}, {'number': 2}
+    ]
+    assert bot.storage.pop_scheduled(key, 100, count=3) == [
+        {'number': 3}, {'number': 4}
+    ]
@@ -0,0 +1,59 @@
+from leonard.utils import clean_message, normalize_message
+
+# Original message, cleaned message, normalized message.
+# Outputs were saved from replacing words one by one,
+# compiled normalizer must give the same results.
+GOLDEN_MESSAGES = [
+    ('Hey, Leonard, who is Taylor Swift', 'hey leonard who is taylor swift',
+     'heywhotaylor swift'),
+    ("What's the weather for tomorrow?", "what's the weather for tomorrow",
+     "what's the weathertomorrow"),
+    ('weather', 'weather',
+     'weather'),
+    ('!help', 'help',
+     'help'),
+    ('Hi hi hi', 'hi hi hi',
+     'hi'),
+    ('how is it going', 'how is it going',
+     'is it going'),
+    ('Tell me: what is love?', 'tell me what is love',
+     'whatlove'),
+    ('Leo, remind me (please) to call mom', 'leo remind me please to call mom',
+     'remindplease to call mom'),
+    ('Эй, бот, какая погода завтра?', 'эй бот какая погода завтра',
+     'бот какая погода завтра'),
+    ('Слушай, мне нужно купить молоко', 'слушай мне нужно купить молоко',
+     'слушайкупить молоко'),
+    ('Я хочу новости', 'я хочу новости',
+     'новости'),
+    ('o h for i', 'o h for i',
+     'o hi'),
+    ('  so   you know   ', 'so you know',
+     'you know'),
+    ('', '',
+     ''),
+    ('Prime factors 12', 'prime factors 12',
+     'prime factors 12'),
+    ('i need i want', 'i need i want',
+     'i want'),
+    ('h for i', 'h for i',
+     'hi'),
+    ('ок, что про погоду', 'ок что про погоду',
+     'чтопогоду'),
+    ('Do you know who is Obama?', 'do you know who is obama',
+     'whoobama'),
+    ('note: buy milk; bread', 'note buy milk bread',
+     'note buy milk bread'),
+    ('hello, can you give me a gif?', 'hello can you give me a gif',
+     'cangivea gif'),
+]
+
+
+def test_clean_message():
+    for (message, cleaned, normalized) in GOLDEN_MESSAGES:
+        assert clean_message(message) == cleaned
+
+
+def test_normalize_message():
+    for (message, cleaned, normalized) in GOLDEN_MESSAGES:
+        assert normalize_message(cleaned) == normalized
@@ -0,0 +1,83 @@
+import threading
+
+from leonard import workers
+from leonard.utils import NextHook
+
+
+def test_running_tasks():
+    pool = workers.WorkerPool(workers=2, queue_size=10)
+    pool.start()
+    results = []
+    for i in range(20):
+        pool.submit(results.append, i)
+    pool.stop()
+    assert sorted(results) == list(range(20))
+    assert pool.stats()['processed'] == 20
+
+
+def test_blocking_on_full_queue():
+    pool = workers.WorkerPool(workers=1, queue_size=1)
+    pool.start()
+    event = threading.Event()
+    # First task blocks worker, second fills queue
+    pool.submit(event.wait)
+    pool.submit(event.wait)
+    submitted = threading.Event()
+
+    def submit_third_task():
+        pool.submit(event.wait)
+        submitted.set()
+
+    thread = threading.Thread(target=submit_third_task)
+    thread.start()
+    assert not submitted.wait(0.2)
+    assert pool.stats()['busy_workers'] == 1
+    assert pool.stats()['queue_depth'] == 1
+    event.set()
+    assert submitted.wait(1)
+    thread.join()
+    pool.stop()
+
+
+def test_surviving_task_errors():
+    pool = workers.WorkerPool(workers=1, queue_size=10)
+    pool.start()
+    results = []
+    pool.submit(lambda: 2 / 0)
+    pool.submit(results.append, 1)
+    pool.stop()
+    assert results == [1]
+
+
+def test_ordering_tasks_by_key():
+    pool = workers.WorkerPool(workers=4, queue_size=100)
+    pool.start()
+    results = {'first': [], 'second': []}
+    for i in range(20):
+        pool.submit(results['first'].append, i, key='first')
+        pool.submit(results['second'].append, i, key='second')
+    pool.stop()
+    assert results['first'] == list(range(20))
+    assert results['second'] == list(range(20))
+
+
+def test_lanes_for_keys():
+    pool = workers.WorkerPool(workers=4, queue_size=100)
+    assert pool.get_lane('tg1') == pool.get_lane('tg1')
+    assert 0 <= pool.get_lane('tg2') < 4
+
+
+def test_surviving_next_hook():
+    pool = workers.WorkerPool(workers=1, queue_size=10)
+    pool.start()
+    results = []
+
+    def reject():
+        raise NextHook
+
+    pool.submit(reject)
+    pool.submit(results.append, 1)
+    pool.join()
+    assert pool.threads[0].is_alive()
+    pool.stop()
+    assert results == [1]